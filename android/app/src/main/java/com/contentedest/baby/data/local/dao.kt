@@ -41,6 +41,12 @@ interface EventsDao {
 
     @Query("SELECT * FROM events WHERE event_id = :eventId")
     suspend fun getEventById(eventId: String): EventEntity?
+
+    @Query("SELECT * FROM events")
+    suspend fun getAllEventsIncludingDeleted(): List<EventEntity>
+
+    @Query("DELETE FROM events WHERE event_id IN (:eventIds)")
+    suspend fun deleteEvents(eventIds: List<String>)
 }
 
 @Dao
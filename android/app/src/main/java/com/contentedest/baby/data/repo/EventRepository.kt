@@ -128,6 +128,24 @@ class EventRepository(
         android.util.Log.d("EventRepository", "Successfully saved ${events.size} events to local database")
     }
 
+    /**
+     * Adopt the server's full event set after a pull answered `reset`.
+     * Local events the server no longer has are dropped (their tombstones were compacted),
+     * except ones this device created after the newest of its events the server holds:
+     * those have not been pushed yet.
+     */
+    suspend fun replaceWithServerEvents(events: List<EventDto>, deviceId: String) = withContext(Dispatchers.IO) {
+        val serverIds = events.mapTo(HashSet()) { it.eventId }
+        val newestPushed = events.filter { it.deviceId == deviceId }.maxOfOrNull { it.createdTs } ?: Long.MIN_VALUE
+        val stale = eventsDao.getAllEventsIncludingDeleted()
+            .filter { it.event_id !in serverIds && !(it.device_id == deviceId && it.created_ts > newestPushed) }
+            .map { it.event_id }
+        // Stays under SQLite's bound-parameter limit
+        stale.chunked(500).forEach { eventsDao.deleteEvents(it) }
+        android.util.Log.d("EventRepository", "Reset: dropped ${stale.size} local events the server no longer has")
+        saveServerEvents(events)
+    }
+
     suspend fun startBreastFeed(nowUtc: Long, deviceId: String, side: BreastSide): String = withContext(Dispatchers.IO) {
         val id = UUID.randomUUID().toString()
         val event = EventEntity(
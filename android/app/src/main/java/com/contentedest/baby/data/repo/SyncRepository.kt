@@ -2,6 +2,7 @@ package com.contentedest.baby.data.repo
 
 import com.contentedest.baby.net.ApiService
 import com.contentedest.baby.net.EventDto
+import com.contentedest.baby.net.SyncPullResponse
 import com.contentedest.baby.data.repo.Result
 import kotlinx.coroutines.Dispatchers
 import kotlinx.coroutines.withContext
@@ -16,10 +17,9 @@ class SyncRepository(private val api: ApiService) {
         }
     }
 
-    suspend fun syncPull(since: Long): Result<Pair<Long, List<EventDto>>> = withContext(Dispatchers.IO) {
+    suspend fun syncPull(since: Long): Result<SyncPullResponse> = withContext(Dispatchers.IO) {
         try {
-            val response = api.syncPull(since)
-            Result.Success(response.serverClock to response.events)
+            Result.Success(api.syncPull(since))
         } catch (e: Exception) {
             Result.Failure(e)
         }
@@ -1,17 +1,22 @@
 package com.contentedest.baby.di
 
+import android.content.Context
 import com.contentedest.baby.net.ApiService
+import com.contentedest.baby.net.TokenStorage
 import com.contentedest.baby.data.repo.SyncRepository
 import dagger.Module
 import dagger.Provides
 import dagger.hilt.InstallIn
+import dagger.hilt.android.qualifiers.ApplicationContext
 import dagger.hilt.components.SingletonComponent
+import okhttp3.Cache
 import okhttp3.Interceptor
 import okhttp3.OkHttpClient
 import okhttp3.logging.HttpLoggingInterceptor
 import retrofit2.Retrofit
 import retrofit2.converter.moshi.MoshiConverterFactory
 import com.squareup.moshi.Moshi
+import java.io.File
 import javax.inject.Singleton
 import com.contentedest.baby.BuildConfig
 
@@ -20,10 +25,25 @@ import com.contentedest.baby.BuildConfig
 object NetworkModule {
     @Provides
     @Singleton
-    fun provideOkHttp(): OkHttpClient {
+    fun provideOkHttp(@ApplicationContext context: Context, tokenStorage: TokenStorage): OkHttpClient {
         val logging = HttpLoggingInterceptor().apply { level = HttpLoggingInterceptor.Level.BASIC }
+        // Sync and growth endpoints require the device token issued by /pair
+        val auth = Interceptor { chain ->
+            val token = tokenStorage.getToken()
+            val request = if (token != null) {
+                chain.request().newBuilder().header("Authorization", "Bearer $token").build()
+            } else {
+                chain.request()
+            }
+            chain.proceed(request)
+        }
+        
+        // Pull endpoints send ETags; the cache revalidates with If-None-Match and reuses the body on 304
+        val cache = Cache(File(context.cacheDir, "http"), 20L * 1024 * 1024)
         
         return OkHttpClient.Builder()
+            .cache(cache)
+            .addInterceptor(auth)
             .addInterceptor(logging)
             .build()
     }
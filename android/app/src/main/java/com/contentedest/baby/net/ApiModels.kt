@@ -47,7 +47,9 @@ data class SyncPushResponse(
 @JsonClass(generateAdapter = true)
 data class SyncPullResponse(
     @Json(name = "server_clock") val serverClock: Long,
-    val events: List<EventDto>
+    val events: List<EventDto>,
+    // Tombstones this device never saw were compacted away: drop synced state and pull from since=0
+    val reset: Boolean = false
 )
 
 @JsonClass(generateAdapter = true)
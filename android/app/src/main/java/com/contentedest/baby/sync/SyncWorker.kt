@@ -62,7 +62,28 @@ class SyncWorker(
 
             return@coroutineScope when (pullResult) {
                 is com.contentedest.baby.data.repo.Result.Success -> {
-                    val (newClock, events) = pullResult.data
+                    if (pullResult.data.reset) {
+                        // The server compacted tombstones this device never pulled, and refuses its
+                        // pushes until it has pulled everything again
+                        android.util.Log.w("SyncWorker", "Server requested a reset, pulling from since=0")
+                        eventRepository.updateServerClock(0)
+                        when (val full = syncRepository.syncPull(0)) {
+                            is com.contentedest.baby.data.repo.Result.Success -> {
+                                eventRepository.replaceWithServerEvents(full.data.events, deviceId)
+                                eventRepository.updateServerClock(full.data.serverClock)
+                                android.util.Log.d("SyncWorker", "Reset complete at clock ${full.data.serverClock}")
+                            }
+                            is com.contentedest.baby.data.repo.Result.Failure -> {
+                                android.util.Log.e("SyncWorker", "Full pull after reset failed", full.exception)
+                                return@coroutineScope WorkerResult.retry()
+                            }
+                        }
+                        // Push again now that the server accepts this device's changes
+                        syncRepository.syncPush(eventRepository.getAllEventsAsDtos())
+                        return@coroutineScope WorkerResult.success()
+                    }
+                    val newClock = pullResult.data.serverClock
+                    val events = pullResult.data.events
                     if (events.isNotEmpty()) {
                         eventRepository.saveServerEvents(events)
                         android.util.Log.d("SyncWorker", "Saved ${events.size} events to local database")
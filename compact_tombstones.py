@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Remove soft-deleted events and growth rows that no device still needs.
+
+A tombstone is removed once every enabled device has pulled past it. With
+--retention-days, tombstones last updated longer ago than that are removed as
+well; any device that had not pulled them yet is told to do a full resync on
+its next pull.
+
+Usage:
+    # Report what would be removed
+    ./compact_tombstones.py --dry-run
+
+    # Remove tombstones all devices have seen
+    ./compact_tombstones.py
+
+    # Also remove anything deleted more than 90 days ago
+    ./compact_tombstones.py --retention-days 90
+
+    # Use custom database path
+    ./compact_tombstones.py --db-path /path/to/data.db
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add repo root to path
+repo_root = os.path.abspath(os.path.dirname(__file__))
+if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Remove tombstones that every device has already pulled",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument(
+        "--retention-days",
+        type=int,
+        help="Also remove tombstones last updated more than this many days ago"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report what would be removed without deleting anything"
+    )
+    parser.add_argument(
+        "--db-path",
+        help="Override database path (uses TCB_DB_PATH env var or default)"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    # Set the database path before importing database modules, which read TCB_DB_PATH at import time
+    if args.db_path:
+        os.environ["TCB_DB_PATH"] = os.path.abspath(args.db_path)
+
+    try:
+        from server.app.database import SessionLocal, DB_PATH
+        from server.app import crud
+    except Exception as import_err:
+        print(f"Failed to import server modules: {import_err}")
+        print("Ensure you run this from the repository root and that Python can import the 'server.app' package.")
+        return 1
+
+    if not os.path.exists(DB_PATH):
+        print(f"❌ ERROR: Database file not found at: {DB_PATH}")
+        return 1
+
+    retention_before = None
+    if args.retention_days is not None:
+        retention_before = int(time.time()) - args.retention_days * 86400
+
+    session = SessionLocal()
+    try:
+        report = crud.compact_tombstones(session, retention_before, dry_run=args.dry_run)
+    except Exception as e:
+        session.rollback()
+        print(f"\n❌ Compaction failed: {e}")
+        return 1
+    finally:
+        session.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"Database: {DB_PATH}")
+    print(f"Lowest device watermark: {report['watermark']}")
+    verb = "Would remove" if report["dry_run"] else "Removed"
+    print(f"{verb} {report['events_removed']} event and {report['growth_removed']} growth tombstones")
+    if report["devices_reset"]:
+        print(f"Devices needing a full resync (horizon {report['horizon']}): {', '.join(report['devices_reset'])}")
+    if report["dry_run"]:
+        print("Run without --dry-run to apply changes")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -219,6 +219,51 @@ def command_devices(args: argparse.Namespace) -> int:
         session.close()
 
 
+def format_seconds(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    minutes = int(round(value / 60))
+    return f"{minutes // 60}h{minutes % 60:02d}m"
+
+
+def command_analytics(args: argparse.Namespace) -> int:
+    if args.db_path:
+        os.environ["TCB_DB_PATH"] = args.db_path
+
+    from server.app.analytics import analyze, load_event_arrays
+
+    session = SessionLocal()
+    try:
+        arrays = load_event_arrays(session).between(args.since_ts, args.until_ts)
+        report = analyze(arrays, rolling_days=args.window)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print(f"events: {report['events']}")
+            for label, stats in (
+                ("sleep", report["sleep"]["durations"]),
+                ("longest/night", report["sleep"]["longest_per_night"]),
+                ("wake window", report["wake_windows"]),
+                ("feed interval", report["feed_intervals"]),
+            ):
+                if not stats["count"]:
+                    print(f"{label:>14}: n=0")
+                    continue
+                print(
+                    f"{label:>14}: n={stats['count']:<6} median={format_seconds(stats['median'])}  "
+                    f"p10={format_seconds(stats['p10'])}  p90={format_seconds(stats['p90'])}  "
+                    f"max={format_seconds(stats['max'])}"
+                )
+            daily = report["daily_sleep"]
+            if daily["trend_seconds_per_day"] is not None:
+                print(f"daily sleep trend: {daily['trend_seconds_per_day'] * 30 / 60:+.1f} min per 30 days")
+            for month in daily["monthly_mean"]:
+                print(f"  {month['month']}: {format_seconds(month['seconds'])} per day")
+        return 0
+    finally:
+        session.close()
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(
         description=(
@@ -269,6 +314,13 @@ def build_parser() -> argparse.ArgumentParser:
     pd.set_defaults(enabled=None)
     pd.set_defaults(func=command_devices)
 
+    # analytics
+    pa = sub.add_parser("analytics", help="Sleep, wake window and feed interval statistics")
+    pa.add_argument("--since", type=parse_time, dest="since_ts", help="Lower bound time (epoch or ISO)")
+    pa.add_argument("--until", type=parse_time, dest="until_ts", help="Upper bound time (epoch or ISO)")
+    pa.add_argument("--window", type=int, default=7, help="Rolling window for daily sleep, in days")
+    pa.set_defaults(func=command_analytics)
+
     return p
 
 
@@ -0,0 +1,31 @@
+from __future__ import annotations
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import create_engine
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get("connection") is None:
+    fileConfig(config.config_file_name)
+
+
+def run_migrations(connection, target_metadata) -> None:
+    # SQLite cannot ALTER most constraints in place; batch mode rebuilds tables instead
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+connection = config.attributes.get("connection")
+if connection is not None:
+    # Called from app.migrations.ensure_schema with an open connection
+    run_migrations(connection, config.attributes.get("target_metadata"))
+else:
+    # Called from the alembic CLI inside server/
+    from app.database import Base, SQLALCHEMY_DATABASE_URL
+    from app import models  # noqa: F401  (registers tables on Base.metadata)
+
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, future=True)
+    with engine.connect() as conn:
+        run_migrations(conn, Base.metadata)
+    engine.dispose()
@@ -0,0 +1,85 @@
+"""Baseline schema (devices, events, watermarks, server_clock, growth_data)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00
+
+Databases created before migrations existed already have some or all of these
+tables, so each one is only created when missing.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "devices" not in existing:
+        op.create_table(
+            "devices",
+            sa.Column("device_id", sa.String(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=True),
+            sa.Column("created_ts", sa.Integer(), nullable=False),
+            sa.Column("last_seen_ts", sa.Integer(), nullable=False),
+            sa.Column("token_hash", sa.String(), nullable=False),
+            sa.Column("enabled", sa.Boolean(), nullable=False),
+        )
+    if "events" not in existing:
+        op.create_table(
+            "events",
+            sa.Column("event_id", sa.String(), primary_key=True),
+            sa.Column("type", sa.String(), nullable=False),
+            sa.Column("details", sa.String(), nullable=True),
+            sa.Column("payload", sa.JSON(), nullable=True),
+            sa.Column("start_ts", sa.Integer(), nullable=True),
+            sa.Column("end_ts", sa.Integer(), nullable=True),
+            sa.Column("ts", sa.Integer(), nullable=True),
+            sa.Column("created_ts", sa.Integer(), nullable=False),
+            sa.Column("updated_ts", sa.Integer(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("deleted", sa.Boolean(), nullable=False),
+            sa.Column("device_id", sa.String(), nullable=False),
+            sa.Column("server_clock", sa.Integer(), nullable=False),
+        )
+    if "watermarks" not in existing:
+        op.create_table(
+            "watermarks",
+            sa.Column("device_id", sa.String(), primary_key=True),
+            sa.Column("last_clock", sa.Integer(), nullable=False),
+            sa.Column("updated_ts", sa.Integer(), nullable=False),
+        )
+    if "server_clock" not in existing:
+        op.create_table(
+            "server_clock",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("counter", sa.Integer(), nullable=False),
+        )
+    if "growth_data" not in existing:
+        op.create_table(
+            "growth_data",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("device_id", sa.String(), nullable=False),
+            sa.Column("category", sa.String(), nullable=False),
+            sa.Column("value", sa.Float(), nullable=False),
+            sa.Column("unit", sa.String(), nullable=False),
+            sa.Column("ts", sa.Integer(), nullable=False),
+            sa.Column("created_ts", sa.Integer(), nullable=False),
+            sa.Column("updated_ts", sa.Integer(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("deleted", sa.Boolean(), nullable=False),
+            sa.Column("server_clock", sa.Integer(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    for table in ("growth_data", "server_clock", "watermarks", "events", "devices"):
+        op.drop_table(table)
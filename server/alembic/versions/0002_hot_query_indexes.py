@@ -0,0 +1,36 @@
+"""Indexes for sync pulls, growth pulls and token lookup
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_events_server_clock", "events", ["server_clock"]),
+    ("ix_growth_data_server_clock", "growth_data", ["server_clock"]),
+    ("ix_growth_data_category", "growth_data", ["category"]),
+    ("ix_growth_data_ts", "growth_data", ["ts"]),
+    ("ix_devices_token_hash", "devices", ["token_hash"]),
+]
+
+
+def upgrade() -> None:
+    # if_not_exists: scripts that call create_all may already have built these
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
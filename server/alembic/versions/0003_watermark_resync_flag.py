@@ -0,0 +1,30 @@
+"""Per-device resync flag set by tombstone compaction
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("watermarks") as batch_op:
+        batch_op.add_column(
+            sa.Column("resync_required", sa.Boolean(), nullable=False, server_default=sa.false())
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("watermarks") as batch_op:
+        batch_op.drop_column("resync_required")
@@ -0,0 +1,43 @@
+"""Daily rollups table and the per-day event index that maintains it
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 13:00:00
+
+Existing databases are backfilled by `python -m app.bootstrap`, which
+rebuilds the rollups after applying this migration.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Scripts that call create_all may already have built the table and index
+    if "daily_rollups" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "daily_rollups",
+            sa.Column("day", sa.String(), primary_key=True),
+            sa.Column("type", sa.String(), primary_key=True),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("sleep_seconds", sa.Integer(), nullable=False),
+            sa.Column("nap_seconds", sa.Integer(), nullable=False),
+            sa.Column("night_seconds", sa.Integer(), nullable=False),
+            sa.Column("longest_sleep_seconds", sa.Integer(), nullable=False),
+            sa.Column("bottle_ml", sa.Integer(), nullable=False),
+            sa.Column("solids_amount", sa.Integer(), nullable=False),
+        )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_events_type_day_ts ON events (type, coalesce(start_ts, ts))")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_events_type_day_ts", table_name="events", if_exists=True)
+    op.drop_table("daily_rollups")
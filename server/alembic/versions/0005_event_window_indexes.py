@@ -0,0 +1,33 @@
+"""Indexes for time-window event queries (GET /events)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 16:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_events_window", "events", ["deleted", "type", "start_ts", "end_ts"]),
+    ("ix_events_window_ts", "events", ["deleted", "type", "ts"]),
+]
+
+
+def upgrade() -> None:
+    # if_not_exists: scripts that call create_all may already have built these
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,210 @@
+"""Vectorized analyses over the event history: sleep and wake intervals, feed spacing, trends.
+
+Non-deleted events are loaded once per server clock into contiguous NumPy
+arrays; every analysis after that is array arithmetic. Local days follow the
+same zone as the daily rollups.
+"""
+from __future__ import annotations
+import threading
+from dataclasses import dataclass
+from itertools import chain
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from .models import Event
+from .rollups import NIGHT_MIN_SECONDS, local_datetime
+
+TYPE_CODES = {"sleep": 0, "feed": 1, "nappy": 2}
+MISSING = -1  # stands in for NULL timestamps in the int64 arrays
+# A night runs noon to noon, so a sleep starting after midnight counts towards the evening before
+NIGHT_OFFSET_SECONDS = 12 * 3600
+DEFAULT_ROLLING_DAYS = 7
+SLEEP_HISTOGRAM_EDGES = np.arange(0, 12 * 3600 + 1, 1800)
+FEED_INTERVAL_HISTOGRAM_EDGES = np.arange(0, 8 * 3600 + 1, 1800)
+PERCENTILES = (10, 50, 90)
+
+
+@dataclass(frozen=True)
+class EventArrays:
+    type: np.ndarray  # int8 TYPE_CODES
+    start: np.ndarray  # int64 epoch seconds, MISSING when NULL
+    end: np.ndarray
+    anchor: np.ndarray  # start_ts, else ts: the instant an event is filed under
+
+    def __len__(self) -> int:
+        return len(self.type)
+
+    def between(self, from_ts: int | None, to_ts: int | None) -> "EventArrays":
+        mask = np.ones(len(self), dtype=bool)
+        if from_ts is not None:
+            mask &= self.anchor >= from_ts
+        if to_ts is not None:
+            mask &= self.anchor < to_ts
+        return EventArrays(self.type[mask], self.start[mask], self.end[mask], self.anchor[mask])
+
+
+def load_event_arrays(session: Session) -> EventArrays:
+    """One query returning plain integers, ordered by anchor; no ORM objects are built."""
+    anchor = func.coalesce(Event.start_ts, Event.ts)
+    type_code = case({name: code for name, code in TYPE_CODES.items()}, value=Event.type, else_=MISSING)
+    stmt = (
+        select(
+            type_code,
+            func.coalesce(Event.start_ts, MISSING),
+            func.coalesce(Event.end_ts, MISSING),
+            func.coalesce(anchor, MISSING),
+        )
+        .where(Event.deleted == False, anchor != None)
+        .order_by(anchor)
+    )
+    # Flattening the rows into fromiter avoids numpy probing each Row as a sequence
+    rows = np.fromiter(chain.from_iterable(session.execute(stmt)), dtype=np.int64).reshape(-1, 4)
+    return EventArrays(
+        type=np.ascontiguousarray(rows[:, 0], dtype=np.int8),
+        start=np.ascontiguousarray(rows[:, 1]),
+        end=np.ascontiguousarray(rows[:, 2]),
+        anchor=np.ascontiguousarray(rows[:, 3]),
+    )
+
+
+class EventArrayCache:
+    """The loaded arrays, reused until the server clock moves."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entry: tuple[int, EventArrays] | None = None
+
+    def get(self, session: Session, clock: int) -> EventArrays:
+        with self._lock:
+            entry = self._entry
+        if entry is not None and entry[0] == clock:
+            return entry[1]
+        arrays = load_event_arrays(session)
+        with self._lock:
+            self._entry = (clock, arrays)
+        return arrays
+
+
+event_array_cache = EventArrayCache()
+
+
+def _utc_offset(ts: int) -> int:
+    dt = local_datetime(ts)
+    return int((dt if dt.tzinfo else dt.astimezone()).utcoffset().total_seconds())
+
+
+def local_seconds(ts: np.ndarray) -> np.ndarray:
+    """Timestamps shifted into local wall-clock seconds, so // 86400 is the local day.
+
+    The UTC offset is looked up once per distinct UTC day; only days whose
+    offset changes (DST) fall back to a lookup per timestamp.
+    """
+    if len(ts) == 0:
+        return ts.astype(np.int64)
+    days, inverse = np.unique(ts // 86400, return_inverse=True)
+    day_start = np.array([_utc_offset(int(d) * 86400) for d in days], dtype=np.int64)
+    day_end = np.array([_utc_offset(int(d) * 86400 + 86399) for d in days], dtype=np.int64)
+    offsets = day_start[inverse]
+    changing = np.flatnonzero((day_start != day_end)[inverse])
+    if len(changing):
+        offsets[changing] = [_utc_offset(int(t)) for t in ts[changing]]
+    return ts + offsets
+
+
+def interval_stats(values: np.ndarray) -> dict:
+    if len(values) == 0:
+        return {"count": 0}
+    p10, p50, p90 = np.percentile(values, PERCENTILES)
+    return {
+        "count": int(len(values)),
+        "mean": float(values.mean()),
+        "median": float(p50),
+        "p10": float(p10),
+        "p90": float(p90),
+        "min": float(values.min()),
+        "max": float(values.max()),
+    }
+
+
+def histogram(values: np.ndarray, edges: np.ndarray) -> dict:
+    """Counts per bin; values past the last edge are counted in the last bin."""
+    counts, _ = np.histogram(np.clip(values, edges[0], edges[-1]), bins=edges)
+    return {"bin_edges_seconds": edges.tolist(), "counts": counts.tolist()}
+
+
+def _day_label(day: int) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+def analyze(arrays: EventArrays, rolling_days: int = DEFAULT_ROLLING_DAYS) -> dict:
+    sleep = (arrays.type == TYPE_CODES["sleep"]) & (arrays.start != MISSING) & (arrays.end != MISSING)
+    sleep_start = arrays.start[sleep]
+    sleep_end = arrays.end[sleep]
+    durations = sleep_end - sleep_start
+    # Arrays are ordered by anchor, which for sleeps is start_ts
+    wake_windows = sleep_start[1:] - sleep_end[:-1]
+    wake_windows = wake_windows[wake_windows > 0]
+
+    feed_times = arrays.anchor[arrays.type == TYPE_CODES["feed"]]
+    feed_intervals = np.diff(feed_times)
+    feed_intervals = feed_intervals[feed_intervals > 0]
+
+    report: dict = {
+        "events": int(len(arrays)),
+        "sleep": {
+            "durations": interval_stats(durations),
+            "histogram": histogram(durations, SLEEP_HISTOGRAM_EDGES),
+            "start_hour_counts": [],
+            "longest_per_night": {"count": 0},
+        },
+        "wake_windows": interval_stats(wake_windows),
+        "feed_intervals": {
+            **interval_stats(feed_intervals),
+            "histogram": histogram(feed_intervals, FEED_INTERVAL_HISTOGRAM_EDGES),
+        },
+        "daily_sleep": {"days": 0, "rolling_days": rolling_days, "rolling_mean": [], "monthly_mean": [],
+                        "trend_seconds_per_day": None},
+    }
+    if len(durations) == 0:
+        report["sleep"]["start_hour_counts"] = [0] * 24
+        return report
+
+    local_start = local_seconds(sleep_start)
+    start_day = local_start // 86400
+    hours = local_start % 86400 // 3600
+    report["sleep"]["start_hour_counts"] = np.bincount(hours, minlength=24).tolist()
+
+    night = (local_start - NIGHT_OFFSET_SECONDS) // 86400
+    nights, night_inverse = np.unique(night, return_inverse=True)
+    longest = np.zeros(len(nights), dtype=np.int64)
+    np.maximum.at(longest, night_inverse, durations)
+    report["sleep"]["longest_per_night"] = {
+        **interval_stats(longest),
+        "nights_with_long_sleep": int((longest >= NIGHT_MIN_SECONDS).sum()),
+    }
+
+    first_day = int(start_day.min())
+    totals = np.bincount(start_day - first_day, weights=durations).astype(np.float64)
+    daily = report["daily_sleep"]
+    daily["days"] = int(len(totals))
+    if len(totals) >= rolling_days:
+        rolling = np.convolve(totals, np.ones(rolling_days) / rolling_days, mode="valid")
+        daily["rolling_mean"] = [
+            {"day": _day_label(first_day + rolling_days - 1 + i), "seconds": float(v)}
+            for i, v in enumerate(rolling)
+        ]
+    if len(totals) >= 2:
+        daily["trend_seconds_per_day"] = float(np.polyfit(np.arange(len(totals)), totals, 1)[0])
+    months = (np.arange(len(totals)) + first_day).astype("datetime64[D]").astype("datetime64[M]")
+    month_keys, month_inverse = np.unique(months, return_inverse=True)
+    month_means = np.bincount(month_inverse, weights=totals) / np.bincount(month_inverse)
+    daily["monthly_mean"] = [
+        {"month": str(m), "seconds": float(v)} for m, v in zip(month_keys, month_means)
+    ]
+    return report
+
+
+def event_report(session: Session, clock: int, from_ts: int | None = None, to_ts: int | None = None,
+                 rolling_days: int = DEFAULT_ROLLING_DAYS) -> dict:
+    arrays = event_array_cache.get(session, clock).between(from_ts, to_ts)
+    return {"server_clock": clock, "from_ts": from_ts, "to_ts": to_ts, **analyze(arrays, rolling_days)}
@@ -1,10 +1,57 @@
 from __future__ import annotations
+import hmac
+import os
+import threading
+import time
 from fastapi import Header, HTTPException, status, Depends
-from sqlalchemy.orm import Session
-from .database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import AsyncSessionLocal, SessionLocal
 from .models import Device
 from .security import token_hash as th
 
+# Seconds a resolved token is trusted without hitting the database. Invalidation is
+# per process, so this also bounds how long another worker may accept a rotated token.
+TOKEN_CACHE_TTL = 60.0
+# Bearer token for /admin/*; unset switches those endpoints off
+ADMIN_TOKEN = os.getenv("TCB_ADMIN_TOKEN")
+
+
+class TokenCache:
+    """token_hash -> enabled Device, with expiry and per-device invalidation."""
+
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._entries: dict[str, tuple[Device, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token_h: str) -> Device | None:
+        with self._lock:
+            entry = self._entries.get(token_h)
+            if entry is None:
+                return None
+            device, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[token_h]
+                return None
+            return device
+
+    def put(self, token_h: str, device: Device) -> None:
+        with self._lock:
+            self._entries[token_h] = (device, time.monotonic() + self.ttl)
+
+    def invalidate_device(self, device_id: str) -> None:
+        with self._lock:
+            for key in [k for k, (d, _) in self._entries.items() if d.device_id == device_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
 
 def get_db():
     db = SessionLocal()
@@ -14,14 +61,42 @@ def get_db():
         db.close()
 
 
-def get_current_device(authorization: str | None = Header(default=None), db: Session = Depends(get_db)) -> Device:
+async def get_async_db():
+    # crud functions take a sync Session; call them through `await db.run_sync(crud.fn, ...)`
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def bearer_token(authorization: str | None) -> str | None:
     if not authorization or not authorization.lower().startswith("bearer "):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
-    token = authorization.split(" ", 1)[1].strip()
+        return None
+    return authorization.split(" ", 1)[1].strip()
+
+
+async def device_for_token(db: AsyncSession, token: str) -> Device | None:
     token_h = th(token)
-    device = db.query(Device).filter(Device.token_hash == token_h, Device.enabled == True).first()
+    device = token_cache.get(token_h)
+    if device is not None:
+        return device
+    device = await db.scalar(select(Device).where(Device.token_hash == token_h, Device.enabled == True))
+    if device is not None:
+        token_cache.put(token_h, device)
+    return device
+
+
+async def get_current_device(authorization: str | None = Header(default=None), db: AsyncSession = Depends(get_async_db)) -> Device:
+    token = bearer_token(authorization)
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+    device = await device_for_token(db, token)
     if not device:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     return device
 
 
+async def require_admin(authorization: str | None = Header(default=None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled")
+    token = bearer_token(authorization)
+    if not token or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
@@ -0,0 +1,88 @@
+"""One-off startup work: schema migrations, optional CSV seeding and the rollup backfill.
+
+Run it once before starting the workers:
+
+    python -m app.bootstrap [--seed] [--csv PATH]
+
+With TCB_BOOTSTRAPPED=1 set for the workers, their startup skips migrations
+entirely. Otherwise each worker calls startup_migrations(), and an exclusive
+lock next to the database makes them run one at a time: the first applies any
+pending migrations and the rest find the schema already at head.
+"""
+from __future__ import annotations
+import argparse
+import fcntl
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .database import DB_PATH, SessionLocal, engine
+from .models import DailyRollup, Event
+from .rollups import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+BOOTSTRAP_LOCK_PATH = f"{DB_PATH}.bootstrap.lock"
+
+
+@contextmanager
+def bootstrap_lock(path: str = BOOTSTRAP_LOCK_PATH) -> Iterator[None]:
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def bootstrap(seed: bool = False, csv_path: str | None = None) -> dict:
+    from .migrations import ensure_schema
+
+    started = time.perf_counter()
+    with bootstrap_lock():
+        migrated = ensure_schema(engine)
+        seeded = rollups = 0
+        db = SessionLocal()
+        try:
+            if seed:
+                from .seed import seed_database
+                seeded = seed_database(db, csv_path)
+            rollups = backfill_rollups(db)
+        finally:
+            db.close()
+    elapsed = time.perf_counter() - started
+    logger.info(f"Bootstrap finished in {elapsed:.2f}s (migrated={migrated}, seeded={seeded}, rollups={rollups})")
+    return {"migrated": migrated, "seeded": seeded, "rollups": rollups, "seconds": elapsed}
+
+
+def backfill_rollups(db: Session) -> int:
+    """Build daily rollups for a database that has events but none yet (new table, or a fresh seed)."""
+    if db.scalar(select(DailyRollup.day).limit(1)) is not None:
+        return 0
+    if db.scalar(select(Event.event_id).limit(1)) is None:
+        return 0
+    # Filling a new or freshly seeded table changes no answer a client has cached
+    return rebuild_rollups(db, bump_clock=False)
+
+
+def startup_migrations() -> None:
+    if os.getenv("TCB_BOOTSTRAPPED") == "1":
+        return
+    bootstrap(seed=False)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Migrate (and optionally seed) the server database")
+    parser.add_argument("--seed", action="store_true", help="Seed an empty database from the sample CSV")
+    parser.add_argument("--csv", dest="csv_path", help="CSV to seed from (default: TCB_SEED_CSV or the built-in path)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    bootstrap(seed=args.seed, csv_path=args.csv_path)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,82 @@
+from __future__ import annotations
+import zlib
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Largest request body accepted after inflating a gzip payload
+MAX_DECOMPRESSED_BODY = 32 * 1024 * 1024
+
+
+class ResponseGzipMiddleware(GZipMiddleware):
+    """GZipMiddleware that leaves already-compressed downloads (APKs) alone."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compresslevel: int = 6,
+                 exclude_prefixes: tuple[str, ...] = ()) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class GzipRequestMiddleware:
+    """Inflate request bodies sent with `Content-Encoding: gzip` before routing.
+
+    Responses are handled by Starlette's GZipMiddleware; this covers the other
+    direction so devices can compress large /sync/push batches.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int = MAX_DECOMPRESSED_BODY) -> None:
+        self.app = app
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or Headers(scope=scope).get("content-encoding", "").lower() != "gzip":
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        received = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunk = message.get("body", b"")
+            received += len(chunk)
+            if received > self.max_size:
+                await JSONResponse({"detail": "Request body too large"}, status_code=413)(scope, receive, send)
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = inflater.decompress(b"".join(chunks), self.max_size + 1)
+        except zlib.error:
+            await JSONResponse({"detail": "Malformed gzip body"}, status_code=400)(scope, receive, send)
+            return
+        if len(body) > self.max_size or inflater.unconsumed_tail:
+            await JSONResponse({"detail": "Request body too large"}, status_code=413)(scope, receive, send)
+            return
+
+        headers = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        scope = dict(scope, headers=headers)
+
+        body_sent = False
+
+        async def receive_inflated() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        await self.app(scope, receive_inflated, send)
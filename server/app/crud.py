@@ -1,8 +1,21 @@
 from __future__ import annotations
+import time
 from typing import Iterable, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from .models import Device, Event, ServerClock, GrowthData
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import Select, delete, func, or_, select, tuple_, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import Device, Event, ServerClock, GrowthData, Watermark
+from .notify import notifier
+from .rollups import RollupKey, recompute_rollups, rollup_key
+
+# Stays well under SQLite's bound-parameter limit for IN (...) lists
+PREFETCH_CHUNK_SIZE = 500
+# Rows buffered per fetch when streaming a pull
+STREAM_BATCH_SIZE = 500
+EVENT_TYPES = ("sleep", "feed", "nappy")
+# Timed events starting further back than this are not looked at when overlapping a window,
+# which keeps the index range bounded; real sleeps and feeds are far shorter
+MAX_EVENT_SECONDS = 2 * 86400
 
 
 def ensure_server_clock(session: Session) -> ServerClock:
@@ -16,17 +29,48 @@ def ensure_server_clock(session: Session) -> ServerClock:
 
 
 def next_clock(session: Session) -> int:
-    sc = ensure_server_clock(session)
-    sc.counter += 1
-    session.add(sc)
+    clock = reserve_clocks(session, 1)
     session.commit()
-    session.refresh(sc)
-    return sc.counter
+    return clock
+
+
+def reserve_clocks(session: Session, count: int) -> int:
+    """Atomically reserve `count` consecutive clocks without committing; returns the first one.
+
+    The increment is a single UPDATE ... RETURNING, so workers in other processes can
+    never be handed an overlapping block. It also takes SQLite's write lock until the
+    caller commits or rolls back; reserving 0 takes the lock without consuming a clock.
+    """
+    table = ServerClock.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == 1)
+        .values(counter=table.c.counter + count)
+        .returning(table.c.counter)
+    )
+    last = session.execute(stmt).scalar_one_or_none()
+    if last is None:
+        session.execute(sqlite_insert(table).values(id=1, counter=0).on_conflict_do_nothing())
+        last = session.execute(stmt).scalar_one()
+    return last - count + 1
 
 
 def get_clock(session: Session) -> int:
-    sc = ensure_server_clock(session)
-    return sc.counter
+    counter = session.scalar(select(ServerClock.counter).where(ServerClock.id == 1))
+    return counter or 0
+
+
+def get_pull_state(session: Session, device_id: str) -> Tuple[int, bool]:
+    """The server clock and whether `device_id` must restart from since=0, in one query."""
+    resync = (
+        select(Watermark.resync_required)
+        .where(Watermark.device_id == device_id)
+        .scalar_subquery()
+    )
+    row = session.execute(select(ServerClock.counter, resync).where(ServerClock.id == 1)).first()
+    if row is None:
+        return 0, False
+    return row[0], bool(row[1])
 
 
 def get_device_by_id(session: Session, device_id: str) -> Device | None:
@@ -45,9 +89,129 @@ def upsert_device(session: Session, device: Device) -> None:
     session.commit()
 
 
-def select_events_since(session: Session, since_clock: int) -> list[Event]:
-    stmt = select(Event).where(Event.server_clock > since_clock)
-    return list(session.scalars(stmt).all())
+def prefetch_events(session: Session, event_ids: Iterable[str]) -> dict[str, Event]:
+    ids = list(event_ids)
+    found: dict[str, Event] = {}
+    for i in range(0, len(ids), PREFETCH_CHUNK_SIZE):
+        stmt = select(Event).where(Event.event_id.in_(ids[i:i + PREFETCH_CHUNK_SIZE]))
+        for ev in session.scalars(stmt):
+            found[ev.event_id] = ev
+    return found
+
+
+def prefetch_growth_data(session: Session, ids: Iterable[str]) -> dict[str, GrowthData]:
+    ids = list(ids)
+    found: dict[str, GrowthData] = {}
+    for i in range(0, len(ids), PREFETCH_CHUNK_SIZE):
+        stmt = select(GrowthData).where(GrowthData.id.in_(ids[i:i + PREFETCH_CHUNK_SIZE]))
+        for gd in session.scalars(stmt):
+            found[gd.id] = gd
+    return found
+
+
+def events_since_stmt(since_clock: int, limit: int | None = None) -> Select:
+    stmt = select(Event).where(Event.server_clock > since_clock).order_by(Event.server_clock)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def events_in_window_stmt(
+    from_ts: int,
+    to_ts: int,
+    types: Iterable[str] = EVENT_TYPES,
+    after: Tuple[int, str] | None = None,
+    limit: int | None = None,
+) -> Select:
+    """Non-deleted events overlapping [from_ts, to_ts), ordered by (start_ts else ts, event_id).
+
+    A timed event overlaps when it starts before to_ts and ends after from_ts
+    (an unfinished one counts from its start); an instant, when its ts is in
+    the window. `after` is the (anchor, event_id) of the last row already sent.
+
+    The two kinds are separate range scans of ix_events_window and
+    ix_events_window_ts joined with UNION ALL; written as one OR'd query,
+    SQLite uses neither index.
+    """
+    types = list(types)
+    timed = select(Event).where(
+        Event.deleted == False,
+        Event.type.in_(types),
+        Event.start_ts >= from_ts - MAX_EVENT_SECONDS,
+        Event.start_ts < to_ts,
+        or_(Event.start_ts >= from_ts, Event.end_ts > from_ts),
+    )
+    instant = select(Event).where(
+        Event.deleted == False,
+        Event.type.in_(types),
+        Event.ts >= from_ts,
+        Event.ts < to_ts,
+        Event.start_ts == None,
+    )
+    if after is not None:
+        timed = timed.where(tuple_(Event.start_ts, Event.event_id) > tuple_(*after))
+        instant = instant.where(tuple_(Event.ts, Event.event_id) > tuple_(*after))
+    window = aliased(Event, union_all(timed, instant).subquery("window"))
+    stmt = select(window).order_by(func.coalesce(window.start_ts, window.ts), window.event_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def select_events_in_window(session: Session, from_ts: int, to_ts: int, types: Iterable[str] = EVENT_TYPES,
+                            after: Tuple[int, str] | None = None, limit: int | None = None) -> list[Event]:
+    return list(session.scalars(events_in_window_stmt(from_ts, to_ts, types, after, limit)))
+
+
+def set_device_enabled(session: Session, device_id: str, enabled: bool) -> Device | None:
+    device = session.get(Device, device_id)
+    if device is None:
+        return None
+    device.enabled = enabled
+    session.commit()
+    return device
+
+
+def record_watermark(session: Session, device_id: str, acked_clock: int, now: int) -> None:
+    """Raise a device's acknowledged clock (never lower it) and refresh its last-seen time."""
+    table = Watermark.__table__
+    stmt = sqlite_insert(table).values(device_id=device_id, last_clock=acked_clock, updated_ts=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.device_id],
+        set_={
+            "last_clock": func.max(table.c.last_clock, stmt.excluded.last_clock),
+            "updated_ts": stmt.excluded.updated_ts,
+        },
+    )
+    session.execute(stmt)
+    session.commit()
+
+
+def resync_required(session: Session, device_id: str) -> bool:
+    stmt = select(Watermark.resync_required).where(Watermark.device_id == device_id)
+    return bool(session.scalar(stmt))
+
+
+def clear_resync_required(session: Session, device_id: str) -> None:
+    session.execute(
+        update(Watermark).where(Watermark.device_id == device_id).values(resync_required=False)
+    )
+    session.commit()
+
+
+def select_active_watermarks(session: Session) -> list[Tuple[Device, Watermark | None]]:
+    """Every enabled device with its watermark; devices that never synced have None."""
+    stmt = (
+        select(Device, Watermark)
+        .outerjoin(Watermark, Watermark.device_id == Device.device_id)
+        .where(Device.enabled == True)
+        .order_by(Device.device_id)
+    )
+    return [(device, wm) for device, wm in session.execute(stmt).all()]
+
+
+def select_events_since(session: Session, since_clock: int, limit: int | None = None) -> list[Event]:
+    return list(session.scalars(events_since_stmt(since_clock, limit)).all())
 
 
 def resolve_event(existing: Event | None, incoming: Event) -> Tuple[Event, bool]:
@@ -71,23 +235,62 @@ def resolve_event(existing: Event | None, incoming: Event) -> Tuple[Event, bool]
     return existing, False
 
 
-def upsert_events(session: Session, incoming_events: Iterable[Event]) -> Tuple[list[Event], int]:
-    applied: list[Event] = []
-    sc_before = get_clock(session)
-    for inc in incoming_events:
-        existing = session.get(Event, inc.event_id)
+def collapse_events(incoming_events: Iterable[Event]) -> list[Event]:
+    """Keep only the newest copy of each event_id, preserving first-seen order."""
+    return _collapse_newest(incoming_events, lambda ev: ev.event_id)
+
+
+def collapse_growth_data(incoming_data: Iterable[GrowthData]) -> list[GrowthData]:
+    """Keep only the newest copy of each growth id, preserving first-seen order."""
+    return _collapse_newest(incoming_data, lambda gd: gd.id)
+
+
+def _collapse_newest(items, key) -> list:
+    newest: dict = {}
+    for inc in items:
+        current = newest.get(key(inc))
+        if current is None or (inc.version, inc.updated_ts, inc.device_id) > (
+            current.version, current.updated_ts, current.device_id
+        ):
+            newest[key(inc)] = inc
+    return list(newest.values())
+
+
+def upsert_events(session: Session, incoming_events: Iterable[Event]) -> Tuple[list[Tuple[Event, bool]], int]:
+    """Apply a push batch in a single transaction with one clock reservation.
+
+    Returns (stored event, changed) per distinct event_id and the new server clock.
+    Daily rollups for the days a changed event left or joined are recomputed in the same transaction.
+    """
+    results: list[Tuple[Event, bool]] = []
+    winners: list[Event] = []
+    batch = collapse_events(incoming_events)
+    if not batch:
+        return results, get_clock(session)
+    # Take the write lock before reading, so resolution sees rows no other worker can change
+    new_clock = reserve_clocks(session, 0) - 1
+    existing_by_id = prefetch_events(session, (inc.event_id for inc in batch))
+    touched_rollups: set[RollupKey] = set()
+    for inc in batch:
+        existing = existing_by_id.get(inc.event_id)
+        # resolve_event updates `existing` in place, so note the day it counted towards first
+        previous_key = rollup_key(existing) if existing is not None else None
         winner, changed = resolve_event(existing, inc)
         if changed:
-            clock = next_clock(session)
-            winner.server_clock = clock
+            winners.append(winner)
+            touched_rollups.update(k for k in (previous_key, rollup_key(winner)) if k is not None)
+        results.append((winner, changed))
+    if winners:
+        first = reserve_clocks(session, len(winners))
+        for offset, winner in enumerate(winners):
+            winner.server_clock = first + offset
             session.add(winner)
-            session.commit()
-            session.refresh(winner)
-        applied.append(winner)
-    new_clock = get_clock(session)
-    if new_clock < sc_before:
-        new_clock = sc_before
-    return applied, new_clock
+        new_clock = first + len(winners) - 1
+        recompute_rollups(session, touched_rollups)
+    session.commit()
+    if winners:
+        notifier.notify(new_clock)
+    return results, new_clock
 
 
 def resolve_growth_data(existing: GrowthData | None, incoming: GrowthData) -> Tuple[GrowthData, bool]:
@@ -111,16 +314,39 @@ def resolve_growth_data(existing: GrowthData | None, incoming: GrowthData) -> Tu
 
 
 def upsert_growth_data(session: Session, incoming_data: GrowthData) -> Tuple[GrowthData, int]:
-    existing = session.get(GrowthData, incoming_data.id)
-    winner, changed = resolve_growth_data(existing, incoming_data)
-    if changed:
-        clock = next_clock(session)
-        winner.server_clock = clock
-        session.add(winner)
-        session.commit()
-        session.refresh(winner)
-    new_clock = get_clock(session)
-    return winner, new_clock
+    results, new_clock = upsert_growth_batch(session, [incoming_data])
+    return results[0][0], new_clock
+
+
+def upsert_growth_batch(
+    session: Session, incoming_data: Iterable[GrowthData]
+) -> Tuple[list[Tuple[GrowthData, bool]], int]:
+    """Apply growth entries in a single transaction with one clock reservation, as upsert_events does.
+
+    Returns (stored entry, changed) per distinct id and the new server clock.
+    """
+    results: list[Tuple[GrowthData, bool]] = []
+    winners: list[GrowthData] = []
+    batch = collapse_growth_data(incoming_data)
+    if not batch:
+        return results, get_clock(session)
+    new_clock = reserve_clocks(session, 0) - 1
+    existing_by_id = prefetch_growth_data(session, (inc.id for inc in batch))
+    for inc in batch:
+        winner, changed = resolve_growth_data(existing_by_id.get(inc.id), inc)
+        if changed:
+            winners.append(winner)
+        results.append((winner, changed))
+    if winners:
+        first = reserve_clocks(session, len(winners))
+        for offset, winner in enumerate(winners):
+            winner.server_clock = first + offset
+            session.add(winner)
+        new_clock = first + len(winners) - 1
+    session.commit()
+    if winners:
+        notifier.notify(new_clock)
+    return results, new_clock
 
 
 def select_growth_data_since(session: Session, since_clock: int, category: str | None = None) -> list[GrowthData]:
@@ -130,11 +356,111 @@ def select_growth_data_since(session: Session, since_clock: int, category: str |
     return list(session.scalars(stmt).all())
 
 
-def get_growth_data_by_category(session: Session, category: str) -> list[GrowthData]:
-    stmt = select(GrowthData).where(
-        GrowthData.category == category,
-        GrowthData.deleted == False
-    ).order_by(GrowthData.ts)
-    return list(session.scalars(stmt).all())
+def growth_pull_stmt(since_clock: int, category: str | None = None) -> Select:
+    """Same row selection as GET /growth: changes since a clock, else live rows by ts."""
+    if since_clock > 0:
+        stmt = select(GrowthData).where(GrowthData.server_clock > since_clock)
+        if category:
+            stmt = stmt.where(GrowthData.category == category)
+        return stmt
+    stmt = select(GrowthData).where(GrowthData.deleted == False)
+    if category:
+        stmt = stmt.where(GrowthData.category == category)
+    return stmt.order_by(GrowthData.ts)
+
+
+def select_growth_pull(session: Session, since_clock: int, category: str | None = None) -> list[GrowthData]:
+    return list(session.scalars(growth_pull_stmt(since_clock, category)).all())
+
+
+def compaction_watermark(session: Session) -> int:
+    """Lowest acknowledged clock across enabled devices.
+
+    A device at 0 counts too: it has finished a full pull and holds live rows,
+    and its next pull asks for changes since that pull's clock. A device with
+    no watermark row has not pulled since watermarks were recorded, so it may
+    hold anything and pins the watermark at 0.
+    """
+    stmt = (
+        select(func.min(func.coalesce(Watermark.last_clock, 0)))
+        .select_from(Device)
+        .outerjoin(Watermark, Watermark.device_id == Device.device_id)
+        .where(Device.enabled == True)
+    )
+    return session.scalar(stmt) or 0
+
+
+def devices_behind(session: Session, horizon: int) -> list[str]:
+    """Enabled devices acknowledged below `horizon`, including those with no watermark row."""
+    stmt = (
+        select(Device.device_id)
+        .outerjoin(Watermark, Watermark.device_id == Device.device_id)
+        .where(Device.enabled == True, func.coalesce(Watermark.last_clock, 0) < horizon)
+        .order_by(Device.device_id)
+    )
+    return list(session.scalars(stmt))
+
+
+def flag_resync_required(session: Session, device_ids: list[str], now: int) -> None:
+    """Set resync_required for each device, creating the watermark row where there is none."""
+    if not device_ids:
+        return
+    table = Watermark.__table__
+    stmt = sqlite_insert(table).values(
+        [{"device_id": d, "last_clock": 0, "updated_ts": now, "resync_required": True} for d in device_ids]
+    )
+    session.execute(stmt.on_conflict_do_update(index_elements=[table.c.device_id],
+                                               set_={"resync_required": True}))
+
+
+def compact_tombstones(session: Session, retention_before: int | None = None, dry_run: bool = False) -> dict:
+    """Physically delete soft-deleted events and growth rows that no device still needs.
+
+    A tombstone goes once every device has pulled past its clock, or, when
+    `retention_before` is given, once it was last updated before that time.
+    Devices whose watermark is below the newest removed clock are flagged to
+    restart from since=0, and the clock is bumped so cached full pulls go stale.
+    """
+    if not dry_run:
+        reserve_clocks(session, 0)  # take the write lock before reading the watermarks
+    watermark = compaction_watermark(session)
+    removed: dict[str, int] = {}
+    horizon = 0
+    for key, model in (("events", Event), ("growth", GrowthData)):
+        expired = model.server_clock <= watermark
+        if retention_before is not None:
+            expired = expired | (model.updated_ts < retention_before)
+        cond = (model.deleted == True) & expired
+        count, max_clock = session.execute(
+            select(func.count(), func.max(model.server_clock)).where(cond)
+        ).one()
+        removed[key] = count
+        horizon = max(horizon, max_clock or 0)
+        if count and not dry_run:
+            session.execute(delete(model).where(cond))
+
+    devices_reset = devices_behind(session, horizon) if horizon else []
+    new_clock = get_clock(session)
+    if dry_run:
+        return _compaction_report(True, watermark, retention_before, removed, horizon, devices_reset, new_clock)
+
+    if any(removed.values()):
+        flag_resync_required(session, devices_reset, int(time.time()))
+        new_clock = reserve_clocks(session, 1)
+    session.commit()
+    if any(removed.values()):
+        notifier.notify(new_clock)
+    return _compaction_report(False, watermark, retention_before, removed, horizon, devices_reset, new_clock)
 
 
+def _compaction_report(dry_run, watermark, retention_before, removed, horizon, devices_reset, server_clock) -> dict:
+    return {
+        "dry_run": dry_run,
+        "watermark": watermark,
+        "retention_before": retention_before,
+        "events_removed": removed["events"],
+        "growth_removed": removed["growth"],
+        "horizon": horizon,
+        "devices_reset": devices_reset,
+        "server_clock": server_clock,
+    }
@@ -1,15 +1,20 @@
 from __future__ import annotations
 import os
 from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from sqlalchemy.engine import Engine
 
 # Allow overriding DB path for tests via env var
 DB_PATH = os.environ.get("TCB_DB_PATH", os.path.join(os.path.dirname(__file__), "..", "data.db"))
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.abspath(DB_PATH)}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{os.path.abspath(DB_PATH)}"
 
 os.makedirs(os.path.dirname(os.path.abspath(DB_PATH)), exist_ok=True)
 
+# Seconds a connection waits for another worker's write lock before "database is locked"
+SQLITE_BUSY_TIMEOUT = 30
+
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     try:
@@ -27,7 +32,13 @@ class Base(DeclarativeBase):
     pass
 
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=False, future=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=False, future=True, connect_args={"timeout": SQLITE_BUSY_TIMEOUT})
+# Rows stay loaded after commit so a batch can be serialized without re-selecting each one
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
 
 
+# Async engine for the API endpoints; scripts and migrations keep using the sync engine above.
+# Its connections also go through set_sqlite_pragma via async_engine.sync_engine.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, connect_args={"timeout": SQLITE_BUSY_TIMEOUT})
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+import os
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.orm import Session
+from .database import DB_PATH
+from .models import Device, Event, GrowthData
+
+
+def _file_info(path: str) -> dict:
+    exists = os.path.exists(path)
+    return {
+        "path": os.path.realpath(path) if exists else os.path.abspath(path),
+        "exists": exists,
+        "size_bytes": os.path.getsize(path) if exists else None,
+    }
+
+
+def database_report(session: Session, checkpoint: bool = False) -> dict:
+    """What the server is actually reading: file locations, journal state, tables and row counts.
+
+    Only run on request. A WAL checkpoint competes with writers, so it is opt-in and PASSIVE.
+    """
+    database_list = session.execute(text("PRAGMA database_list")).fetchall()
+    tables = inspect(session.get_bind()).get_table_names()
+    report: dict = {
+        "configured": _file_info(DB_PATH),
+        "wal": _file_info(f"{DB_PATH}-wal"),
+        "sqlite_databases": [{"name": row[1], "file": row[2]} for row in database_list],
+        "journal_mode": session.execute(text("PRAGMA journal_mode")).scalar(),
+        "tables": tables,
+        "counts": {},
+    }
+    for key, model in (("events", Event), ("growth_data", GrowthData)):
+        if model.__tablename__ not in tables:
+            continue
+        total, deleted = session.execute(
+            select(func.count(), func.coalesce(func.sum(model.deleted), 0))
+        ).one()
+        report["counts"][key] = {"total": total, "deleted": deleted}
+    if Device.__tablename__ in tables:
+        report["counts"]["devices"] = {"total": session.scalar(select(func.count()).select_from(Device))}
+
+    if checkpoint and report["journal_mode"] == "wal":
+        busy, log_frames, checkpointed = session.execute(text("PRAGMA wal_checkpoint(PASSIVE)")).one()
+        report["checkpoint"] = {"busy": bool(busy), "log_frames": log_frames, "checkpointed_frames": checkpointed}
+    return report
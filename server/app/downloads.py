@@ -0,0 +1,97 @@
+from __future__ import annotations
+from email.utils import formatdate
+from typing import Iterator
+from fastapi import HTTPException, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+from .etags import etag_matches
+from .releases import ApkFile
+
+APK_MEDIA_TYPE = "application/vnd.android.package-archive"
+# latest.apk is replaced in place, so clients revalidate against the sha256 ETag before reuse
+APK_CACHE_CONTROL = "public, no-cache"
+READ_CHUNK_SIZE = 256 * 1024
+
+
+def apk_etag(apk: ApkFile) -> str:
+    return f'"{apk.sha256}"'
+
+
+def parse_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """Inclusive (start, end) for a single `bytes=` range, or None to send the whole file.
+
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    Raises 416 when the range lies entirely past the end of the file.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, _, last = (part.strip() for part in spec.partition("-"))
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the final N bytes
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    if start > end or start < 0:
+        return None
+    return start, min(end, size - 1)
+
+
+def _read_range(apk: ApkFile, start: int, end: int) -> Iterator[bytes]:
+    with apk.path.open("rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def apk_response(
+    apk: ApkFile,
+    range_header: str | None = None,
+    if_range: str | None = None,
+    if_none_match: str | None = None,
+) -> Response:
+    """The APK, or the requested byte range of it, with validators for caching and resuming."""
+    etag = apk_etag(apk)
+    last_modified = formatdate(apk.mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": APK_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # A resume only applies to the same file; after a new release the client gets all of it
+    if if_range is not None and if_range.strip() not in (etag, last_modified):
+        range_header = None
+    byte_range = parse_range(range_header, apk.size)
+    if byte_range is None:
+        return FileResponse(path=str(apk.path), media_type=APK_MEDIA_TYPE, filename=apk.name, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{apk.size}"
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Disposition"] = f'attachment; filename="{apk.name}"'
+    return StreamingResponse(
+        _read_range(apk, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=APK_MEDIA_TYPE,
+        headers=headers,
+    )
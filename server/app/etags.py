@@ -0,0 +1,34 @@
+from __future__ import annotations
+import hashlib
+from fastapi import Response, status
+
+# Clients may reuse a cached body only after revalidating it with If-None-Match
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def clock_etag(clock: int, **params) -> str:
+    """Weak ETag for a pull: the server clock fully determines the rows, params the selection."""
+    key = "&".join(f"{name}={value}" for name, value in sorted(params.items()))
+    return f'W/"{clock}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]}"'
+
+
+def content_etag(body: bytes) -> str:
+    return f'W/"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in if_none_match.split(","))
+
+
+def cache_headers(etag: str) -> dict[str, str]:
+    return {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
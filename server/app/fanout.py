@@ -0,0 +1,136 @@
+from __future__ import annotations
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+from .notify import notifier
+
+logger = logging.getLogger(__name__)
+
+# Messages buffered per socket before it is considered too slow and dropped
+OUTBOX_SIZE = 64
+# Close code sent to a dropped socket; the client should resync with /sync/pull
+OVERFLOW_CLOSE_CODE = 1013
+# Close code sent when the device is disabled or its token is rotated; reconnect with a current token
+REVOKED_CLOSE_CODE = 1008
+# Seconds the pump waits on the notifier before re-checking whether anyone is connected
+PUMP_WAIT = 5.0
+
+# since_clock -> (clock the message covers up to, serialized message or None if nothing changed)
+ChangeLoader = Callable[[int], Awaitable[tuple[int, str | None]]]
+
+
+@dataclass(eq=False)
+class Subscriber:
+    websocket: object
+    outbox: asyncio.Queue
+    device_id: str | None = None
+    # Set when the hub drops the socket: the code and reason it is closed with
+    close_code: int | None = None
+    close_reason: str = ""
+    sender: asyncio.Task | None = field(default=None, repr=False)
+
+
+class FanoutHub:
+    """Pushes applied changes to every connected device socket.
+
+    One pump task per process waits on the clock notifier, loads the rows past its
+    last clock once, serializes them once, and queues the same message for every
+    socket. Each socket has a bounded outbox; a socket that falls OUTBOX_SIZE messages
+    behind is closed instead of letting its backlog grow.
+
+    Sockets are also indexed by device, so revoking a device closes its sockets.
+    Like the token cache, that only reaches sockets held by this process.
+    """
+
+    def __init__(self, load_changes: ChangeLoader, initial_clock: Callable[[], Awaitable[int]],
+                 outbox_size: int = OUTBOX_SIZE) -> None:
+        self.load_changes = load_changes
+        self.initial_clock = initial_clock
+        self.outbox_size = outbox_size
+        self.subscribers: set[Subscriber] = set()
+        self.by_device: dict[str, set[Subscriber]] = {}
+        self._pump: asyncio.Task | None = None
+
+    async def serve(self, websocket, device_id: str | None = None) -> None:
+        """Run an accepted socket until the client disconnects or is dropped."""
+        sub = Subscriber(websocket, asyncio.Queue(self.outbox_size), device_id)
+        self.subscribers.add(sub)
+        if device_id is not None:
+            self.by_device.setdefault(device_id, set()).add(sub)
+        self._ensure_pump()
+        sub.sender = asyncio.create_task(self._send(sub))
+        receiver = asyncio.create_task(self._receive(websocket))
+        try:
+            _, pending = await asyncio.wait({sub.sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            if sub.close_code is not None:
+                try:
+                    await websocket.close(code=sub.close_code, reason=sub.close_reason)
+                except Exception:
+                    pass
+        finally:
+            self._remove(sub)
+
+    def publish(self, message: str) -> None:
+        for sub in list(self.subscribers):
+            try:
+                sub.outbox.put_nowait(message)
+            except asyncio.QueueFull:
+                logger.warning("Dropping slow websocket subscriber")
+                self._drop(sub, OVERFLOW_CLOSE_CODE, "Too far behind; resync with /sync/pull")
+
+    def close_device(self, device_id: str) -> int:
+        """Close every socket this process holds for a device; returns how many."""
+        subs = list(self.by_device.get(device_id, ()))
+        for sub in subs:
+            self._drop(sub, REVOKED_CLOSE_CODE, "Device token revoked")
+        return len(subs)
+
+    def _drop(self, sub: Subscriber, code: int, reason: str) -> None:
+        sub.close_code = code
+        sub.close_reason = reason
+        self._remove(sub)
+        if sub.sender is not None:
+            sub.sender.cancel()
+
+    def _remove(self, sub: Subscriber) -> None:
+        self.subscribers.discard(sub)
+        subs = self.by_device.get(sub.device_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self.by_device[sub.device_id]
+
+    async def _send(self, sub: Subscriber) -> None:
+        while True:
+            message = await sub.outbox.get()
+            await sub.websocket.send_text(message)
+
+    async def _receive(self, websocket) -> None:
+        # Incoming frames are ignored; this only notices the disconnect
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    def _ensure_pump(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._pump is None or self._pump.done() or self._pump.get_loop() is not loop:
+            self._pump = asyncio.create_task(self._run_pump())
+
+    async def _run_pump(self) -> None:
+        last_clock = await self.initial_clock()
+        while self.subscribers:
+            clock = await notifier.wait_for(last_clock, PUMP_WAIT)
+            if clock <= last_clock:
+                continue
+            try:
+                last_clock, message = await self.load_changes(last_clock)
+            except Exception as e:
+                logger.warning(f"Fan-out load failed: {e}")
+                await asyncio.sleep(notifier.poll_interval)
+                continue
+            if message is not None:
+                self.publish(message)
@@ -0,0 +1,240 @@
+"""WHO weight- and length-for-age percentiles for growth rows, computed on the server.
+
+A port of the app's GrowthPercentileCalculator: LMS values are interpolated
+linearly between the table's half-month points (clamped at both ends), the
+measurement becomes a z-score, and the z-score a percentile through the same
+Abramowitz-Stegun erf, so the server and older clients agree. Age is counted
+from the category's first measurement, as the app's growth screen does.
+
+Every row of a category is done in one pass over NumPy arrays, and the result
+is cached until that category's rows change.
+"""
+from __future__ import annotations
+import math
+import threading
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .models import GrowthData
+
+DAYS_PER_MONTH = 30.4375  # 365.25 / 12
+REFERENCE_PERCENTILES = (5.0, 25.0, 50.0, 75.0, 95.0)
+# Per category: accepted unit spellings and the factor to the table's unit (kg, cm)
+UNIT_FACTORS = {
+    "weight": {"kg": 1.0, "kilogram": 1.0, "kilograms": 1.0,
+               "lb": 0.45359237, "lbs": 0.45359237, "pound": 0.45359237, "pounds": 0.45359237},
+    "height": {"cm": 1.0, "centimeter": 1.0, "centimeters": 1.0, "in": 2.54, "inch": 2.54, "inches": 2.54},
+}
+
+# (age in months, L, M, S), male, from GrowthPercentileCalculator.kt
+WEIGHT_FOR_AGE_LMS = np.array([
+    (0.0, 0.3487, 3.3464, 0.14602),
+    (0.5, 0.255340625, 3.805071875, 0.140822813),
+    (1.5, 0.21154375, 5.063959375, 0.128363438),
+    (2.5, 0.184634375, 6.000365625, 0.120200312),
+    (3.5, 0.16408125, 6.7070375, 0.114950938),
+    (4.5, 0.147115625, 7.268678125, 0.1118025),
+    (5.5, 0.1324375, 7.731146875, 0.11007375),
+    (6.5, 0.1193625, 8.122040625, 0.109241563),
+    (7.5, 0.1075875, 8.460753125, 0.10889),
+    (8.5, 0.096784375, 8.76155625, 0.1088),
+    (9.5, 0.086753125, 9.035559375, 0.10885),
+    (10.5, 0.077421875, 9.290209375, 0.108975937),
+    (11.5, 0.06859375, 9.531240625, 0.109150312),
+    (12.5, 0.060359375, 9.762315625, 0.109364688),
+    (13.5, 0.052428125, 9.985815625, 0.109619062),
+    (14.5, 0.04493125, 10.203540625, 0.109913438),
+    (15.5, 0.03774375, 10.417190625, 0.110237813),
+    (16.5, 0.03085625, 10.627709375, 0.110592187),
+    (17.5, 0.02426875, 10.8354625, 0.110986562),
+    (18.5, 0.01788125, 11.040928125, 0.111410938),
+    (19.5, 0.01169375, 11.244659375, 0.111870625),
+    (20.5, 0.00580625, 11.447490625, 0.112359375),
+    (21.5, 0.00001875, 11.64958125, 0.112878125),
+    (22.5, -0.00556875, 11.85096875, 0.113416875),
+    (23.5, -0.011028125, 12.05155625, 0.113975625),
+    (24.5, -0.016271875, 12.251071875, 0.114554375),
+    (25.5, -0.02143125, 12.448715625, 0.115143125),
+    (26.5, -0.026459375, 12.6438, 0.115741875),
+    (27.5, -0.03130625, 12.83569375, 0.116340625),
+    (28.5, -0.036146875, 13.024059375, 0.116929375),
+    (29.5, -0.040790625, 13.208928125, 0.117518125),
+    (30.5, -0.04536875, 13.390328125, 0.118096875),
+    (31.5, -0.04985625, 13.56863125, 0.118675625),
+    (32.5, -0.054221875, 13.744146875, 0.119244375),
+    (33.5, -0.05853125, 13.917240625, 0.119803125),
+    (34.5, -0.06271875, 14.088525, 0.120351875),
+    (35.5, -0.066853125, 14.258375, 0.120890625),
+    (36.0, -0.068875, 14.3429, 0.1211575),
+])
+LENGTH_FOR_AGE_LMS = np.array([
+    (0.0, 1.0, 49.8842, 0.03795),
+    (0.5, 1.0, 52.53083125, 0.036436875),
+    (1.5, 1.0, 56.685203125, 0.034847188),
+    (2.5, 1.0, 60.000225, 0.033717188),
+    (3.5, 1.0, 62.72061875, 0.032899375),
+    (4.5, 1.0, 64.93963125, 0.032290313),
+    (5.5, 1.0, 66.791971875, 0.031825937),
+    (6.5, 1.0, 68.411109375, 0.031511562),
+    (7.5, 1.0, 69.891946875, 0.031307187),
+    (8.5, 1.0, 71.29124375, 0.0312),
+    (9.5, 1.0, 72.632034375, 0.03117),
+    (10.5, 1.0, 73.91648125, 0.03121),
+    (11.5, 1.0, 75.149140625, 0.03131),
+    (12.5, 1.0, 76.3387, 0.031454688),
+    (13.5, 1.0, 77.4888125, 0.031639063),
+    (14.5, 1.0, 78.601775, 0.031853438),
+    (15.5, 1.0, 79.68214375, 0.03209),
+    (16.5, 1.0, 80.733559375, 0.032352187),
+    (17.5, 1.0, 81.7570875, 0.032636563),
+    (18.5, 1.0, 82.753528125, 0.032940937),
+    (19.5, 1.0, 83.723634375, 0.033255313),
+    (20.5, 1.0, 84.670040625, 0.033589687),
+    (21.5, 1.0, 85.5938875, 0.033924062),
+    (22.5, 1.0, 86.496621875, 0.034268437),
+    (23.5, 1.0, 87.380771875, 0.034622812),
+    (24.5, 1.0, 87.546596875, 0.035247187),
+    (25.5, 1.0, 88.39198125, 0.035591562),
+    (26.5, 1.0, 89.2157125, 0.035925937),
+    (27.5, 1.0, 90.0185125, 0.036260313),
+    (28.5, 1.0, 90.800059375, 0.036579375),
+    (29.5, 1.0, 91.560284375, 0.036889062),
+    (30.5, 1.0, 92.30025, 0.037183437),
+    (31.5, 1.0, 93.02138125, 0.037467813),
+    (32.5, 1.0, 93.7250875, 0.037742188),
+    (33.5, 1.0, 94.4137, 0.037996562),
+    (34.5, 1.0, 95.0897625, 0.038240938),
+    (35.5, 1.0, 95.754828125, 0.038475312),
+])
+LMS_TABLES = {"weight": WEIGHT_FOR_AGE_LMS, "height": LENGTH_FOR_AGE_LMS}
+PERCENTILE_CATEGORIES = tuple(LMS_TABLES)
+
+
+def interpolate_lms(age_months: np.ndarray, table: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    ages = table[:, 0]
+    return tuple(np.interp(age_months, ages, table[:, column]) for column in (1, 2, 3))
+
+
+def z_scores(x: np.ndarray, l: np.ndarray, m: np.ndarray, s: np.ndarray) -> np.ndarray:
+    box_cox = np.abs(l) >= 1e-10
+    safe_l = np.where(box_cox, l, 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(box_cox, ((x / m) ** safe_l - 1.0) / (safe_l * s), np.log(x / m) / s)
+
+
+def erf(x: np.ndarray) -> np.ndarray:
+    """Abramowitz-Stegun 7.1.26 (|error| < 1.5e-7), the approximation the app uses."""
+    a1, a2, a3, a4, a5, p = 0.254829592, -0.284496736, 1.421413741, -1.453152027, 1.061405429, 0.3275911
+    ax = np.abs(x)
+    t = 1.0 / (1.0 + p * ax)
+    y = 1.0 - (((((a5 * t + a4) * t) + a3) * t + a2) * t + a1) * t * np.exp(-ax * ax)
+    return np.sign(x) * y
+
+
+def z_to_percentile(z: np.ndarray) -> np.ndarray:
+    return 50.0 * (1.0 + erf(z / math.sqrt(2.0)))
+
+
+def probit(p: float) -> float:
+    """Inverse standard normal CDF, as the app computes its percentile curves."""
+    p = min(max(p, 0.0000001), 0.9999999)
+    q = p - 0.5
+    if abs(q) < 0.425:
+        r = q * q
+        num = (((-25.44106049637 * r + 41.39119773534) * r - 18.61500062529) * r + 2.50662823884) * q
+        den = (((3.13082909833 * r - 21.06224101826) * r + 23.08336743743) * r - 8.47351093090) * r + 1.0
+        return num / den
+    r = math.sqrt(-math.log(p if q < 0 else 1.0 - p))
+    value = (((2.32121276858 * r + 4.85014127135) * r - 2.29796479134) * r - 2.78718931138) / (
+        (1.63706781897 * r + 3.54388924762) * r + 1.0)
+    return -value if q < 0 else value
+
+
+def measurements_for_z(z: float, l: np.ndarray, m: np.ndarray, s: np.ndarray) -> np.ndarray:
+    box_cox = np.abs(l) >= 1e-10
+    safe_l = np.where(box_cox, l, 1.0)
+    term = 1.0 + z * safe_l * s
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = np.where(box_cox, m * np.abs(term) ** (1.0 / safe_l), m * np.exp(z * s))
+    # The app's fallbacks for extreme z: a tiny value when the term is not positive, else the median
+    value = np.where(box_cox & (term <= 0.0), m * 1e-10, value)
+    return np.where(np.isfinite(value) & (value > 0.0), value, m)
+
+
+def compute_percentiles(category: str, ts: np.ndarray, values: np.ndarray, units: list[str]) -> dict:
+    """Arrays for rows ordered by ts: age, z-score, percentile and the reference curves in each row's unit.
+
+    Rows in an unknown unit get NaN throughout.
+    """
+    table = LMS_TABLES[category]
+    factors = UNIT_FACTORS[category]
+    factor = np.array([factors.get(unit.strip().lower(), np.nan) for unit in units], dtype=np.float64)
+    age_months = (ts - ts[0]) / 86400.0 / DAYS_PER_MONTH if len(ts) else np.empty(0)
+    l, m, s = interpolate_lms(age_months, table)
+    z = z_scores(values * factor, l, m, s)
+    curves = np.stack([
+        measurements_for_z(probit(min(max(p, 0.01), 99.99) / 100.0), l, m, s) / factor
+        for p in REFERENCE_PERCENTILES
+    ], axis=1) if len(ts) else np.empty((0, len(REFERENCE_PERCENTILES)))
+    return {"age_months": age_months, "z_score": z, "percentile": z_to_percentile(z), "curves": curves}
+
+
+def growth_clock(session: Session, category: str) -> tuple[int, int]:
+    """Changes whenever a row of the category is written or compacted away."""
+    return tuple(session.execute(
+        select(func.coalesce(func.max(GrowthData.server_clock), 0), func.count())
+        .where(GrowthData.category == category)
+    ).one())
+
+
+def _finite(value: float) -> float | None:
+    return float(value) if math.isfinite(value) else None
+
+
+def percentile_report(session: Session, category: str) -> dict:
+    rows = session.execute(
+        select(GrowthData.id, GrowthData.ts, GrowthData.value, GrowthData.unit)
+        .where(GrowthData.category == category, GrowthData.deleted == False)
+        .order_by(GrowthData.ts, GrowthData.id)
+    ).all()
+    ids = [r[0] for r in rows]
+    units = [r[3] for r in rows]
+    ts = np.array([r[1] for r in rows], dtype=np.int64)
+    values = np.array([r[2] for r in rows], dtype=np.float64)
+    result = compute_percentiles(category, ts, values, units)
+    points = [
+        {
+            "id": ids[i],
+            "ts": int(ts[i]),
+            "value": float(values[i]),
+            "unit": units[i],
+            "age_months": float(result["age_months"][i]),
+            "z_score": _finite(result["z_score"][i]),
+            "percentile": _finite(result["percentile"][i]),
+            "reference_values": [_finite(v) for v in result["curves"][i]] if math.isfinite(result["z_score"][i]) else None,
+        }
+        for i in range(len(ids))
+    ]
+    return {"category": category, "reference_percentiles": list(REFERENCE_PERCENTILES), "points": points}
+
+
+class PercentileCache:
+    """One report per category, reused until growth_clock moves."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[str, tuple[tuple[int, int], dict]] = {}
+
+    def get(self, session: Session, category: str) -> tuple[tuple[int, int], dict]:
+        clock = growth_clock(session, category)
+        with self._lock:
+            entry = self._entries.get(category)
+        if entry is not None and entry[0] == clock:
+            return entry
+        entry = (clock, percentile_report(session, category))
+        with self._lock:
+            self._entries[category] = entry
+        return entry
+
+
+percentile_cache = PercentileCache()
@@ -1,23 +1,57 @@
 from __future__ import annotations
 import time
+import json
+from datetime import date
+from typing import Literal
 import logging
-import csv
 import os
-import subprocess
 from pathlib import Path
-from fastapi import FastAPI, Depends, Request, status
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .database import Base, engine, SessionLocal
+from .database import AsyncSessionLocal
 from .models import Device, Event, GrowthData
-from .schemas import PairRequest, PairResponse, EventDTO, SyncPushResponse, SyncPushResponseItem, SyncPullResponse, UpdateInfoResponse, GrowthDataDTO, GrowthPushResponse, GrowthPullResponse
+from .schemas import PairRequest, PairResponse, EventDTO, SyncPushResponse, SyncPushResponseItem, SyncPushAck, SyncPushAckResponse, SyncPullResponse, EventWindowResponse, SyncWaitResponse, DeviceWatermark, WatermarkSummaryResponse, CompactionReport, AnalyticsResponse, StatsResponse, UpdateInfoResponse, GrowthDataDTO, GrowthPushResponse, GrowthPushAck, GrowthBatchResponse, GrowthPullResponse, GrowthPercentilesResponse
 from .security import mint_token, token_hash
-from .auth import get_current_device, get_db
+from .auth import bearer_token, device_for_token, get_current_device, get_db, get_async_db, require_admin, token_cache
+from .compression import GzipRequestMiddleware, ResponseGzipMiddleware
+from .diagnostics import database_report
+from .etags import cache_headers, clock_etag, content_etag, etag_matches, not_modified
+from .fanout import FanoutHub
+from .notify import notifier
+from .watermarks import watermark_tracker
+from .releases import release_catalog
+from .downloads import apk_response
+from .stats import MAX_STATS_BUCKETS, bucket_count, build_buckets, select_stats_buckets
+from . import rollups
+from .rollups import day_bounds
 from . import crud
 
 
 app = FastAPI(title="The Contentedest Baby Server")
 
+# Upper bound for a single /sync/pull page
+MAX_PULL_LIMIT = 5000
+# Page size for GET /events when the client does not ask for one
+DEFAULT_WINDOW_LIMIT = 500
+# Widest [from, to) GET /events serves; this also bounds the sort of the merged index scans
+MAX_WINDOW_SECONDS = 7 * 86400
+# Largest epoch second accepted in a query, well inside SQLite's 64-bit integers
+MAX_QUERY_TS = 2 ** 62
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Longest a /sync/wait request may be parked
+MAX_WAIT_TIMEOUT = 60.0
+# Local days /analytics accepts; both ends still convert to epoch seconds in any zone
+FIRST_ANALYTICS_DAY = date(1970, 1, 1)
+LAST_ANALYTICS_DAY = date(9999, 12, 30)
+# Responses smaller than this are not worth compressing
+GZIP_MINIMUM_SIZE = 1024
+
+# Compress responses for clients sending Accept-Encoding: gzip, and inflate gzip request bodies
+app.add_middleware(ResponseGzipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, exclude_prefixes=("/app/download",))
+app.add_middleware(GzipRequestMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +59,91 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def event_to_dto(ev: Event) -> EventDTO:
+    return EventDTO(
+        event_id=ev.event_id,
+        type=ev.type,
+        details=ev.details,  # Include details field
+        payload=ev.payload,
+        start_ts=ev.start_ts,
+        end_ts=ev.end_ts,
+        ts=ev.ts,
+        created_ts=ev.created_ts,
+        updated_ts=ev.updated_ts,
+        version=ev.version,
+        deleted=ev.deleted,
+        device_id=ev.device_id,
+    )
+
+
+def growth_to_dto(gd: GrowthData) -> GrowthDataDTO:
+    return GrowthDataDTO(
+        id=gd.id,
+        device_id=gd.device_id,
+        category=gd.category,
+        value=gd.value,
+        unit=gd.unit,
+        ts=gd.ts,
+        created_ts=gd.created_ts,
+        updated_ts=gd.updated_ts,
+        version=gd.version,
+        deleted=gd.deleted,
+    )
+
+
+def dto_to_growth(dto: GrowthDataDTO) -> GrowthData:
+    return GrowthData(
+        id=dto.id,
+        device_id=dto.device_id,
+        category=dto.category,
+        value=dto.value,
+        unit=dto.unit,
+        ts=dto.ts,
+        created_ts=dto.created_ts,
+        updated_ts=dto.updated_ts,
+        version=dto.version,
+        deleted=dto.deleted,
+    )
+
+
+async def acknowledge_clock(db: AsyncSession, device: Device, acked_clock: int, current_clock: int) -> None:
+    """Record that `device` holds every change up to `acked_clock` (capped at the server clock)."""
+    acked_clock = max(0, min(acked_clock, current_clock))
+    now = int(time.time())
+    if watermark_tracker.needs_write(device.device_id, acked_clock, now):
+        await db.run_sync(crud.record_watermark, device.device_id, acked_clock, now)
+        watermark_tracker.mark(device.device_id, acked_clock, now)
+
+
+async def reject_if_resync_required(db: AsyncSession, device: Device) -> None:
+    """Refuse writes from a device that missed compacted tombstones.
+
+    Its copies of those rows are still live, and pushing them would bring the
+    deletions back for everyone; it may write again after its since=0 pull.
+    """
+    if await db.run_sync(crud.resync_required, device.device_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Resync required: pull from since=0 first")
+
+
+def reset_stream(current_clock: int) -> StreamingResponse:
+    """NDJSON answer to a device that must resync: the header line alone, flagged `reset`."""
+    line = json.dumps({"server_clock": current_clock, "reset": True}) + "\n"
+    return StreamingResponse(iter([line]), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def ndjson_stream(header: dict, stmt, to_dto):
+    """Stream a header line, then one JSON line per row, using a dedicated session.
+
+    The request's own session is closed before a StreamingResponse body runs,
+    so the generator opens and closes its own.
+    """
+    async with AsyncSessionLocal() as db:
+        yield json.dumps(header) + "\n"
+        rows = await db.stream_scalars(stmt.execution_options(yield_per=crud.STREAM_BATCH_SIZE))
+        async for row in rows:
+            yield to_dto(row).model_dump_json() + "\n"
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     logger.info(f"Request: {request.method} {request.url}")
@@ -32,161 +151,110 @@ async def log_requests(request: Request, call_next):
     logger.info(f"Response: {response.status_code}")
     return response
 
-Base.metadata.create_all(bind=engine)
-
 @app.get("/health", status_code=status.HTTP_200_OK)
-def health():
+async def health():
     return {"status": "ok"}
 
-# Seed database on startup
+# Migrations run once per boot: in the bootstrap command, or in whichever worker takes the lock first
 @app.on_event("startup")
 def startup_event():
-    """Seed database with sample data on startup."""
-    db = SessionLocal()
-    try:
-        seed_database(db)
-    finally:
-        db.close()
-
-def seed_database(db: Session):
-    """Seed the database with sample data from CSV file."""
-    csv_path = "/home/blasky/Projects/extractedest-baby/complete_historical_data/screenshot_processed_data_20250916_212254.csv"
-
-    if not os.path.exists(csv_path):
-        logger.warning(f"CSV file not found at {csv_path}")
-        return
-
-    # Check if database already has data
-    existing_events = db.query(Event).count()
-    if existing_events > 0:
-        logger.info(f"Database already has {existing_events} events, skipping seed")
-        return
-
-    logger.info("Seeding database with CSV data...")
-
-    try:
-        with open(csv_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            events_added = 0
-
-            for row in reader:
-                try:
-                    # Parse date and time
-                    date_str = row['Date']
-                    start_time_str = row['Start'].strip()
-                    end_time_str = row['End'].strip()
-
-                    # Skip entries with missing or empty times
-                    if not start_time_str or not end_time_str:
-                        logger.warning(f"Skipping row with missing times: {row}")
-                        continue
-
-                    # Convert to epoch seconds
-                    # Note: CSV times are in local time (UTC-7), need to convert to UTC
-                    from datetime import datetime, timezone, timedelta
-                    try:
-                        start_datetime = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %I:%M%p")
-                        end_datetime = datetime.strptime(f"{date_str} {end_time_str}", "%Y-%m-%d %I:%M%p")
-                    except ValueError:
-                        # Try alternative format without AM/PM
-                        try:
-                            start_datetime = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %I:%M")
-                            end_datetime = datetime.strptime(f"{date_str} {end_time_str}", "%Y-%m-%d %I:%M")
-                        except ValueError:
-                            logger.warning(f"Could not parse times for row: {row}")
-                            continue
-
-                    # Treat parsed datetime as UTC-7 and convert to UTC
-                    tz_utc_minus_7 = timezone(timedelta(hours=-7))
-                    start_aware = start_datetime.replace(tzinfo=tz_utc_minus_7)
-                    end_aware = end_datetime.replace(tzinfo=tz_utc_minus_7)
-                    start_ts = int(start_aware.timestamp())
-                    end_ts = int(end_aware.timestamp())
-
-                    # Map event types
-                    event_type = row['Type']
-                    if event_type == 'sleep':
-                        event_type = 'sleep'
-                    elif event_type == 'feeding':
-                        event_type = 'feed'
-                    elif event_type == 'diaper':
-                        event_type = 'nappy'
-
-                    # Create event
-                    event = Event(
-                        event_id=f"seed_{events_added}_{start_ts}",
-                        type=event_type,
-                        payload={
-                            'details': row['Details'],
-                            'raw_text': row['Raw_Text']
-                        },
-                        start_ts=start_ts,
-                        end_ts=end_ts,
-                        ts=start_ts,  # Use start time as the main timestamp
-                        created_ts=start_ts,
-                        updated_ts=start_ts,
-                        version=1,
-                        deleted=False,
-                        device_id="seed_device",
-                        server_clock=events_added + 1  # Assign sequential server clock values
-                    )
-
-                    db.add(event)
-                    events_added += 1
-
-                    if events_added % 100 == 0:
-                        db.commit()
-                        logger.info(f"Added {events_added} events...")
-
-                except Exception as e:
-                    logger.warning(f"Failed to process row {row}: {e}")
-                    continue
-
-            db.commit()
-            
-            # Update server clock to match the highest server_clock assigned to seeded events
-            from .crud import ensure_server_clock
-            server_clock = ensure_server_clock(db)
-            server_clock.counter = events_added
-            db.add(server_clock)
-            db.commit()
-            
-            logger.info(f"Successfully seeded database with {events_added} events")
-
-    except Exception as e:
-        logger.error(f"Failed to seed database: {e}")
+    from .bootstrap import startup_migrations
+    startup_migrations()
+    release_catalog.load_build_commit_message()
 
 @app.get("/healthz")
-def healthz():
+async def healthz():
     return {"status": "ok"}
 
-@app.post("/admin/seed")
+@app.post("/admin/seed", dependencies=[Depends(require_admin)])
 def seed_database_endpoint(db: Session = Depends(get_db)):
     """Admin endpoint to seed database with sample data."""
-    seed_database(db)
+    from .seed import seed_database
+    if seed_database(db):
+        # Seeded rows bypass upsert_events, which is what keeps daily_rollups current
+        rollups.rebuild_rollups(db)
     return {"message": "Database seeded successfully"}
 
-@app.get("/admin/events/count")
+@app.get("/admin/watermarks", response_model=WatermarkSummaryResponse, dependencies=[Depends(require_admin)])
+async def get_watermarks(db: AsyncSession = Depends(get_async_db)):
+    """Acknowledged sync clock per enabled device, with the min/max across them."""
+    rows = await db.run_sync(crud.select_active_watermarks)
+    current_clock = await db.run_sync(crud.get_clock)
+    devices = [
+        DeviceWatermark(
+            device_id=device.device_id,
+            name=device.name,
+            last_clock=wm.last_clock if wm else 0,
+            updated_ts=wm.updated_ts if wm else None,
+        ) for device, wm in rows
+    ]
+    clocks = [d.last_clock for d in devices]
+    return WatermarkSummaryResponse(
+        server_clock=current_clock,
+        min_clock=min(clocks) if clocks else None,
+        max_clock=max(clocks) if clocks else None,
+        devices=devices,
+    )
+
+
+@app.post("/admin/compact", response_model=CompactionReport, dependencies=[Depends(require_admin)])
+async def compact(
+    dry_run: bool = True,
+    retention_days: int | None = Query(default=None, ge=1),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Delete tombstones every device has pulled (or older than `retention_days`); dry run by default."""
+    retention_before = None if retention_days is None else int(time.time()) - retention_days * 86400
+    report = await db.run_sync(crud.compact_tombstones, retention_before, dry_run)
+    logger.info(f"Compaction: {report}")
+    return CompactionReport(**report)
+
+
+@app.get("/admin/events/count", dependencies=[Depends(require_admin)])
 def get_event_count(db: Session = Depends(get_db)):
     """Get the current number of events in the database."""
     count = db.query(Event).count()
     return {"count": count}
 
 
+@app.get("/admin/db/diagnostics", dependencies=[Depends(require_admin)])
+def get_db_diagnostics(checkpoint: bool = False, db: Session = Depends(get_db)):
+    """Database file, journal and row-count report; `checkpoint=true` also runs a passive WAL checkpoint."""
+    return database_report(db, checkpoint=checkpoint)
+
+
+@app.post("/admin/devices/{device_id}/disable", dependencies=[Depends(require_admin)])
+async def disable_device(device_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Revoke a device's access; its cached token is dropped immediately."""
+    device = await db.run_sync(crud.set_device_enabled, device_id, False)
+    if device is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Device not found")
+    token_cache.invalidate_device(device_id)
+    hub.close_device(device_id)
+    logger.info(f"Disabled device: {device_id}")
+    return {"device_id": device_id, "enabled": False}
+
+
 @app.post("/pair", response_model=PairResponse)
-def pair(req: PairRequest, db: Session = Depends(get_db)):
+async def pair(req: PairRequest, db: AsyncSession = Depends(get_async_db)):
     now = int(time.time())
 
-    # Check if device already exists and is enabled
-    existing_device = crud.get_device_by_id(db, req.device_id)
-    if existing_device and existing_device.enabled:
+    # Check if device already exists, and refuse it if it was disabled
+    existing_device = await db.run_sync(crud.get_device_by_id, req.device_id)
+    if existing_device and not existing_device.enabled:
+        # Pairing again must not undo /admin/devices/{id}/disable
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Device is disabled")
+    if existing_device:
         # Device already paired, return existing token
         token = mint_token()  # Generate new token for security
         existing_device.last_seen_ts = now
         existing_device.token_hash = token_hash(token)
         if req.name and req.name != existing_device.name:
             existing_device.name = req.name
-        db.commit()
+        await db.commit()
+        token_cache.invalidate_device(req.device_id)
+        # Sockets opened with the old token must reconnect with the new one
+        hub.close_device(req.device_id)
 
         logger.info(f"Re-paired existing device: {req.device_id}, name: {req.name}")
         return PairResponse(device_id=req.device_id, token=token)
@@ -201,14 +269,23 @@ def pair(req: PairRequest, db: Session = Depends(get_db)):
             token_hash=token_hash(token),
             enabled=True,
         )
-        crud.upsert_device(db, device)
+        await db.run_sync(crud.upsert_device, device)
+        token_cache.invalidate_device(req.device_id)
         logger.info(f"Paired new device: {req.device_id}, name: {req.name}")
         return PairResponse(device_id=req.device_id, token=token)
 
 
-@app.post("/sync/push", response_model=SyncPushResponse)
-def sync_push(items: list[EventDTO], db: Session = Depends(get_db)):
-    logger.info(f"Sync push: {len(items)} events")
+@app.post("/sync/push", response_model=SyncPushResponse | SyncPushAckResponse)
+async def sync_push(
+    items: list[EventDTO],
+    ack_only: bool = False,
+    since: int = 0,
+    device: Device = Depends(get_current_device),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Apply a batch of events. `since` is the last clock the device has pulled, recorded as its watermark."""
+    logger.info(f"Sync push: {len(items)} events, ack_only={ack_only}")
+    await reject_if_resync_required(db, device)
     incoming = []
     for dto in items:
         incoming.append(Event(
@@ -225,307 +302,415 @@ def sync_push(items: list[EventDTO], db: Session = Depends(get_db)):
             deleted=dto.deleted,
             device_id=dto.device_id,
         ))
-    applied_events, new_clock = crud.upsert_events(db, incoming)
-    logger.info(f"Applied {len(applied_events)} events, new clock: {new_clock}")
-    results = []
-    for ev in applied_events:
-        results.append(SyncPushResponseItem(
-            applied=True,
-            event=EventDTO(
+    outcomes, new_clock = await db.run_sync(crud.upsert_events, incoming)
+    await acknowledge_clock(db, device, since, new_clock)
+    logger.info(f"Applied {sum(changed for _, changed in outcomes)} of {len(outcomes)} events, new clock: {new_clock}")
+    if ack_only:
+        return SyncPushAckResponse(server_clock=new_clock, results=[
+            SyncPushAck(
                 event_id=ev.event_id,
-                type=ev.type,
-                details=ev.details,  # Include details field
-                payload=ev.payload,
-                start_ts=ev.start_ts,
-                end_ts=ev.end_ts,
-                ts=ev.ts,
-                created_ts=ev.created_ts,
-                updated_ts=ev.updated_ts,
-                version=ev.version,
-                deleted=ev.deleted,
-                device_id=ev.device_id,
-            )
-        ))
+                applied=changed,
+                server_clock=ev.server_clock,
+                event=None if changed else event_to_dto(ev),
+            ) for ev, changed in outcomes
+        ])
+    results = []
+    for ev, changed in outcomes:
+        results.append(SyncPushResponseItem(applied=changed, event=event_to_dto(ev)))
     return SyncPushResponse(server_clock=new_clock, results=results)
 
 
 @app.get("/sync/pull", response_model=SyncPullResponse)
-def sync_pull(since: int = 0, db: Session = Depends(get_db)):
-    events = crud.select_events_since(db, since)
+async def sync_pull(
+    response: Response,
+    since: int = 0,
+    limit: int | None = Query(default=None, ge=1, le=MAX_PULL_LIMIT),
+    stream: bool = False,
+    if_none_match: str | None = Header(default=None),
+    device: Device = Depends(get_current_device),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if stream and limit is not None:
+        # A stream has no next_since/has_more to page with, so a truncated one would look complete
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="'limit' cannot be combined with 'stream'; page with the JSON response instead")
+    # The clock is read before the rows, so a concurrent commit is re-sent rather than skipped
+    current_clock, resync_required = await db.run_sync(crud.get_pull_state, device.device_id)
+    if resync_required:
+        if since > 0:
+            logger.info(f"Sync pull: device {device.device_id} is behind the compaction horizon, asking for a reset")
+            if stream:
+                return reset_stream(current_clock)
+            return SyncPullResponse(server_clock=current_clock, events=[], next_since=0, has_more=True, reset=True)
+        await db.run_sync(crud.clear_resync_required, device.device_id)
+    await acknowledge_clock(db, device, since, current_clock)
+    etag = clock_etag(current_clock, since=since, limit=limit, stream=stream)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    if stream:
+        # NDJSON: {"server_clock": N} first, then one EventDTO per line
+        logger.info(f"Sync pull (stream): since={since}, clock={current_clock}")
+        return StreamingResponse(
+            ndjson_stream({"server_clock": current_clock}, crud.events_since_stmt(since), event_to_dto),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=cache_headers(etag),
+        )
+
+    # Fetch one extra row to learn whether another page follows
+    events = await db.run_sync(crud.select_events_since, since, None if limit is None else limit + 1)
+    has_more = limit is not None and len(events) > limit
+    if has_more:
+        events = events[:limit]
+    logger.info(f"Sync pull: since={since}, limit={limit}, returning {len(events)} events, clock={current_clock}")
+    response.headers.update(cache_headers(etag))
+    payload = [event_to_dto(ev) for ev in events]
+    if limit is None:
+        return SyncPullResponse(server_clock=current_clock, events=payload)
+    next_since = events[-1].server_clock if events else since
+    return SyncPullResponse(server_clock=current_clock, events=payload, next_since=next_since, has_more=has_more)
+
+
+def window_cursor(ev: Event) -> str:
+    anchor = ev.start_ts if ev.start_ts is not None else ev.ts
+    return f"{anchor}:{ev.event_id}"
+
+
+def parse_window_cursor(cursor: str) -> tuple[int, str]:
+    anchor, sep, event_id = cursor.partition(":")
+    try:
+        if not sep or not event_id or abs(int(anchor)) > MAX_QUERY_TS:
+            raise ValueError(cursor)
+        return int(anchor), event_id
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@app.get("/events", response_model=EventWindowResponse)
+async def get_events_in_window(
+    response: Response,
+    from_ts: int = Query(alias="from", ge=0, le=MAX_QUERY_TS),
+    to_ts: int = Query(alias="to", ge=0, le=MAX_QUERY_TS),
+    event_types: list[Literal["sleep", "feed", "nappy"]] | None = Query(default=None, alias="type"),
+    limit: int = Query(default=DEFAULT_WINDOW_LIMIT, ge=1, le=MAX_PULL_LIMIT),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
+    device: Device = Depends(get_current_device),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Non-deleted events overlapping [from, to) (epoch seconds), oldest first, a page at a time.
+
+    Repeat `type` to select several; omit it for all. Pages follow `next_cursor`.
+    A window may span at most MAX_WINDOW_SECONDS.
+    """
+    if from_ts >= to_ts:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'from' must be before 'to'")
+    if to_ts - from_ts > MAX_WINDOW_SECONDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Window must not exceed {MAX_WINDOW_SECONDS} seconds")
+    after = parse_window_cursor(cursor) if cursor else None
+    types = sorted(set(event_types)) if event_types else list(crud.EVENT_TYPES)
+    current_clock = await db.run_sync(crud.get_clock)
+    etag = clock_etag(current_clock, from_ts=from_ts, to_ts=to_ts, types=",".join(types), limit=limit, cursor=cursor)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    # Fetch one extra row to learn whether another page follows
+    events = await db.run_sync(crud.select_events_in_window, from_ts, to_ts, types, after, limit + 1)
+    has_more = len(events) > limit
+    if has_more:
+        events = events[:limit]
+    response.headers.update(cache_headers(etag))
+    return EventWindowResponse(
+        server_clock=current_clock,
+        events=[event_to_dto(ev) for ev in events],
+        next_cursor=window_cursor(events[-1]) if has_more else None,
+        has_more=has_more,
+    )
+
+
+@app.get("/analytics", response_model=AnalyticsResponse)
+def get_analytics(
+    response: Response,
+    from_day: date | None = Query(default=None, alias="from", ge=FIRST_ANALYTICS_DAY, le=LAST_ANALYTICS_DAY),
+    to_day: date | None = Query(default=None, alias="to", ge=FIRST_ANALYTICS_DAY, le=LAST_ANALYTICS_DAY),
+    window: int = Query(default=7, ge=1, le=90),
+    if_none_match: str | None = Header(default=None),
+    device: Device = Depends(get_current_device),
+    db: Session = Depends(get_db),
+):
+    """Sleep duration, wake window and feed interval statistics, histograms and daily sleep trends.
+
+    `from`/`to` are inclusive local days; either may be omitted to leave that end open.
+    A plain def, so loading the history and the NumPy work run in the threadpool
+    rather than on the event loop.
+    """
+    if from_day and to_day and from_day > to_day:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'from' must not be after 'to'")
     current_clock = crud.get_clock(db)
-    logger.info(f"Sync pull: since={since}, returning {len(events)} events, clock={current_clock}")
-    payload = [
-        EventDTO(
-            event_id=ev.event_id,
-            type=ev.type,
-            details=ev.details,  # Include details field
-            payload=ev.payload,
-            start_ts=ev.start_ts,
-            end_ts=ev.end_ts,
-            ts=ev.ts,
-            created_ts=ev.created_ts,
-            updated_ts=ev.updated_ts,
-            version=ev.version,
-            deleted=ev.deleted,
-            device_id=ev.device_id,
-        ) for ev in events
-    ]
-    return SyncPullResponse(server_clock=current_clock, events=payload)
+    etag = clock_etag(current_clock, from_day=from_day, to_day=to_day, window=window)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    from .analytics import event_report  # numpy is only loaded once analytics are asked for
+
+    from_ts = day_bounds(from_day)[0] if from_day else None
+    to_ts = day_bounds(to_day)[1] if to_day else None
+    report = event_report(db, current_clock, from_ts, to_ts, window)
+    response.headers.update(cache_headers(etag))
+    return report
+
+
+@app.get("/stats", response_model=StatsResponse)
+async def get_stats(
+    response: Response,
+    from_day: date = Query(alias="from"),
+    to_day: date = Query(alias="to"),
+    granularity: Literal["day", "week", "month"] = "day",
+    if_none_match: str | None = Header(default=None),
+    device: Device = Depends(get_current_device),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Sleep/feed/nappy totals per day, week or month over an inclusive range of local days.
+
+    Served from daily_rollups with one grouped query; events are never scanned.
+    """
+    if from_day > to_day:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'from' must not be after 'to'")
+    if bucket_count(from_day, to_day, granularity) > MAX_STATS_BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range covers more than {MAX_STATS_BUCKETS} {granularity} buckets; use a coarser granularity",
+        )
+    current_clock = await db.run_sync(crud.get_clock)
+    etag = clock_etag(current_clock, from_day=from_day, to_day=to_day, granularity=granularity,
+                      tz=rollups.ROLLUP_TIMEZONE)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    rows = await db.run_sync(select_stats_buckets, from_day, to_day, granularity)
+    buckets, total = build_buckets(rows, from_day, to_day, granularity)
+    response.headers.update(cache_headers(etag))
+    return StatsResponse(
+        from_day=from_day.isoformat(),
+        to_day=to_day.isoformat(),
+        granularity=granularity,
+        buckets=buckets,
+        total=total,
+    )
+
+
+@app.get("/sync/wait", response_model=SyncWaitResponse)
+async def sync_wait(
+    since: int = 0,
+    timeout: float = Query(default=25.0, gt=0, le=MAX_WAIT_TIMEOUT),
+    device: Device = Depends(get_current_device),
+):
+    """Long-poll: return once the server clock passes `since`, or after `timeout` seconds.
+
+    Parked requests hold no database session; call /sync/pull when `changed` is true.
+    """
+    clock = await notifier.wait_for(since, timeout)
+    return SyncWaitResponse(server_clock=clock, changed=clock > since)
+
+
+async def current_clock() -> int:
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(crud.get_clock)
+
+
+async def load_fanout_message(since: int) -> tuple[int, str | None]:
+    """Everything committed after `since`, as one message shared by every socket."""
+    async with AsyncSessionLocal() as db:
+        clock = await db.run_sync(crud.get_clock)
+        events = await db.run_sync(crud.select_events_since, since)
+        growth = await db.run_sync(crud.select_growth_data_since, since)
+    clock = max([clock] + [row.server_clock for row in events] + [row.server_clock for row in growth])
+    if not events and not growth:
+        return clock, None
+    message = {
+        "server_clock": clock,
+        "events": [event_to_dto(ev).model_dump() for ev in events],
+        "growth": [growth_to_dto(gd).model_dump() for gd in growth],
+    }
+    return clock, json.dumps(message)
+
+
+hub = FanoutHub(load_fanout_message, current_clock)
+
+
+@app.websocket("/sync/ws")
+async def sync_ws(websocket: WebSocket, token: str | None = None, authorization: str | None = Header(default=None)):
+    """Push applied events and growth rows to a paired device as they are committed.
+
+    Authenticate with `Authorization: Bearer <token>`. `?token=` is accepted for clients
+    that cannot set headers, but the query string, token included, is written to
+    uvicorn's access log. Each message is {"server_clock", "events", "growth"}. A socket
+    that falls too far behind is closed with code 1013 and should catch up with
+    /sync/pull before reconnecting; disabling the device or re-pairing it closes its
+    sockets with code 1008.
+    """
+    token = bearer_token(authorization) or token
+    device = None
+    if token:
+        async with AsyncSessionLocal() as db:
+            device = await device_for_token(db, token)
+    if device is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    logger.info(f"WebSocket connected: {device.device_id}")
+    await hub.serve(websocket, device.device_id)
+    logger.info(f"WebSocket closed: {device.device_id}")
 
 
 @app.get("/app/update", response_model=UpdateInfoResponse)
-def get_update_info():
+def get_update_info(response: Response, if_none_match: str | None = Header(default=None)):
     """
-    Returns the latest app version information.
-    Update this when you deploy a new APK version.
+    Returns the latest app version information from server/apks/release.json.
+    The manifest and APK checksum are cached until either file changes.
     """
-    # TODO: Consider storing this in a config file or database for easier updates
-    # For now, hardcode the latest version info
-    # When you build a new APK, update these values and place the APK in server/apks/
-    
-    # Get the base URL from environment or use default
     base_url = os.getenv("BASE_URL", "http://192.168.86.3:8005")
-    
-    # Get the latest commit message from git
-    commit_message = None
-    try:
-        # Get the project root directory (parent of server directory)
-        project_root = Path(__file__).parent.parent.parent
-        result = subprocess.run(
-            ["git", "log", "-1", "--pretty=format:%s"],
-            cwd=project_root,
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0 and result.stdout:
-            commit_message = result.stdout.strip()
-    except (subprocess.TimeoutExpired, subprocess.SubprocessError, Exception) as e:
-        logger.warning(f"Failed to get commit message: {e}")
-        commit_message = None
-    
-    return UpdateInfoResponse(
-        version_code=32,
-        version_name="1.5.2",
-        download_url=f"{base_url}/app/download/latest.apk",
-        release_notes="Initial release",
-        commit_message=commit_message,
-        mandatory=False  # Set to True to force updates
+    release = release_catalog.current()
+    info = UpdateInfoResponse(
+        version_code=release.version_code,
+        version_name=release.version_name,
+        download_url=f"{base_url}/app/download/{release.apk_filename}",
+        release_notes=release.release_notes,
+        commit_message=release.commit_message,
+        mandatory=release.mandatory,
+        sha256=release.apk.sha256 if release.apk else None,
+        size_bytes=release.apk.size if release.apk else None,
     )
+    etag = content_etag(info.model_dump_json().encode("utf-8"))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(cache_headers(etag))
+    return info
 
 
 @app.get("/app/download/{filename}")
-def download_apk(filename: str):
+def download_apk(
+    filename: str,
+    range_header: str | None = Header(default=None, alias="Range"),
+    if_range: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+):
     """
-    Serves APK files from the server/apks/ directory.
+    Serves APK files from the server/apks/ directory, with resumable (Range) downloads.
     Place your APK files in server/apks/ and name the latest one 'latest.apk'
     """
-    apk_dir = Path(__file__).parent.parent / "apks"
-    apk_path = apk_dir / filename
-    
-    if not apk_path.exists():
-        logger.error(f"APK not found: {apk_path}")
-        return {"error": "APK not found"}, status.HTTP_404_NOT_FOUND
-    
-    if not apk_path.is_file():
-        logger.error(f"Path is not a file: {apk_path}")
-        return {"error": "Invalid path"}, status.HTTP_400_BAD_REQUEST
-    
-    logger.info(f"Serving APK: {filename}")
-    return FileResponse(
-        path=str(apk_path),
-        media_type="application/vnd.android.package-archive",
-        filename=filename
-    )
+    if Path(filename).name != filename or filename.startswith(".") or not filename.endswith(".apk"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid APK filename")
+    apk = release_catalog.apk(filename)
+    if apk is None:
+        logger.error(f"APK not found: {filename}")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="APK not found")
+
+    logger.info(f"Serving APK: {filename} (range={range_header})")
+    return apk_response(apk, range_header, if_range, if_none_match)
 
 
 @app.post("/growth", response_model=GrowthPushResponse)
-def create_growth_data(data: GrowthDataDTO, db: Session = Depends(get_db)):
+async def create_growth_data(
+    data: GrowthDataDTO,
+    device: Device = Depends(get_current_device),
+    db: AsyncSession = Depends(get_async_db),
+):
     """Create or update growth data entry."""
     logger.info(f"Growth push: {data.id} ({data.category})")
-    incoming = GrowthData(
-        id=data.id,
-        device_id=data.device_id,
-        category=data.category,
-        value=data.value,
-        unit=data.unit,
-        ts=data.ts,
-        created_ts=data.created_ts,
-        updated_ts=data.updated_ts,
-        version=data.version,
-        deleted=data.deleted,
-    )
-    applied_data, new_clock = crud.upsert_growth_data(db, incoming)
+    await reject_if_resync_required(db, device)
+    applied_data, new_clock = await db.run_sync(crud.upsert_growth_data, dto_to_growth(data))
     logger.info(f"Applied growth data {applied_data.id}, new clock: {new_clock}")
     
-    result_dto = GrowthDataDTO(
-        id=applied_data.id,
-        device_id=applied_data.device_id,
-        category=applied_data.category,
-        value=applied_data.value,
-        unit=applied_data.unit,
-        ts=applied_data.ts,
-        created_ts=applied_data.created_ts,
-        updated_ts=applied_data.updated_ts,
-        version=applied_data.version,
-        deleted=applied_data.deleted,
-    )
-    
     return GrowthPushResponse(
         server_clock=new_clock,
         applied=True,
-        data=result_dto
+        data=growth_to_dto(applied_data)
     )
 
 
+@app.post("/growth/batch", response_model=GrowthBatchResponse)
+async def create_growth_data_batch(
+    items: list[GrowthDataDTO],
+    device: Device = Depends(get_current_device),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Create or update many growth entries in one transaction; results mirror /sync/push?ack_only=true."""
+    logger.info(f"Growth batch push: {len(items)} entries")
+    await reject_if_resync_required(db, device)
+    outcomes, new_clock = await db.run_sync(crud.upsert_growth_batch, [dto_to_growth(dto) for dto in items])
+    logger.info(f"Applied {sum(changed for _, changed in outcomes)} of {len(outcomes)} growth entries, new clock: {new_clock}")
+    return GrowthBatchResponse(server_clock=new_clock, results=[
+        GrowthPushAck(
+            id=gd.id,
+            applied=changed,
+            server_clock=gd.server_clock,
+            data=None if changed else growth_to_dto(gd),
+        ) for gd, changed in outcomes
+    ])
+
+
+@app.get("/growth/percentiles", response_model=GrowthPercentilesResponse)
+def get_growth_percentiles(
+    response: Response,
+    category: Literal["weight", "height"],
+    if_none_match: str | None = Header(default=None),
+    device: Device = Depends(get_current_device),
+    db: Session = Depends(get_db),
+):
+    """WHO percentile, z-score and reference curve values for every measurement of a category.
+
+    A plain def, so a cache miss computes the percentiles in the threadpool, not on the event loop.
+    """
+    from .growth_percentiles import growth_clock, percentile_cache  # numpy is only loaded on first use
+
+    def percentiles_etag(state: tuple[int, int]) -> str:
+        return clock_etag(state[0], category=category, rows=state[1], view="percentiles")
+
+    etag = percentiles_etag(growth_clock(db, category))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    state, report = percentile_cache.get(db, category)
+    response.headers.update(cache_headers(percentiles_etag(state)))
+    return GrowthPercentilesResponse(server_clock=state[0], **report)
+
+
 @app.get("/growth", response_model=GrowthPullResponse)
-def get_growth_data(category: str | None = None, since: int = 0, db: Session = Depends(get_db)):
+async def get_growth_data(
+    response: Response,
+    category: str | None = None,
+    since: int = 0,
+    stream: bool = False,
+    if_none_match: str | None = Header(default=None),
+    device: Device = Depends(get_current_device),
+    db: AsyncSession = Depends(get_async_db),
+):
     """Get growth data entries, optionally filtered by category and server clock."""
-    logger.info(f"Growth pull: category={category}, since={since}")
-    if since > 0:
-        data_list = crud.select_growth_data_since(db, since, category)
-    elif category:
-        data_list = crud.get_growth_data_by_category(db, category)
-    else:
-        # Get all non-deleted entries (when since=0 and no category)
-        from sqlalchemy import select, inspect
-        from .database import DB_PATH
-        
-        # Log database path being used
-        from sqlalchemy import text
-        import os
-        logger.info(f"Database path: {DB_PATH}")
-        logger.info(f"Database path (absolute): {os.path.abspath(DB_PATH)}")
-        logger.info(f"Database path (real/resolved): {os.path.realpath(DB_PATH) if os.path.exists(DB_PATH) else 'N/A'}")
-        logger.info(f"Database file exists: {os.path.exists(DB_PATH)}")
-        if os.path.exists(DB_PATH):
-            logger.info(f"Database file size: {os.path.getsize(DB_PATH)} bytes")
-        
-        # Check what database SQLite is actually using
-        db_path_check = db.execute(text("PRAGMA database_list")).fetchall()
-        logger.info(f"SQLite databases: {db_path_check}")
-        
-        # Also check the actual file path from SQLite
-        if db_path_check:
-            sqlite_path = db_path_check[0][2] if len(db_path_check[0]) > 2 else None
-            if sqlite_path:
-                logger.info(f"SQLite reported path (absolute): {os.path.abspath(sqlite_path) if sqlite_path != ':memory:' else ':memory:'}")
-                logger.info(f"SQLite reported path (real/resolved): {os.path.realpath(sqlite_path) if sqlite_path != ':memory:' and os.path.exists(sqlite_path) else 'N/A'}")
-        
-        # Check if table exists
-        inspector = inspect(db.bind)
-        tables = inspector.get_table_names()
-        logger.info(f"Tables in database: {tables}")
-        has_growth_table = 'growth_data' in tables
-        logger.info(f"growth_data table exists: {has_growth_table}")
-        
-        if has_growth_table:
-            # Check WAL mode and checkpoint if needed
-            wal_mode = db.execute(text("PRAGMA journal_mode")).scalar()
-            logger.info(f"SQLite journal mode: {wal_mode}")
-            if wal_mode == "wal":
-                # Try checkpointing WAL to ensure we see latest data
-                try:
-                    checkpoint_result = db.execute(text("PRAGMA wal_checkpoint")).fetchone()
-                    logger.info(f"WAL checkpoint result: {checkpoint_result}")
-                except Exception as e:
-                    logger.warning(f"WAL checkpoint failed: {e}")
-            
-            # Try direct SQL query to bypass any SQLAlchemy session issues
-            raw_count_result = db.execute(text("SELECT COUNT(*) FROM growth_data WHERE deleted = 0"))
-            raw_count = raw_count_result.scalar()
-            logger.info(f"Raw SQL COUNT query returned: {raw_count} entries")
-            
-            # Also try without the deleted filter to see total count
-            total_raw_count = db.execute(text("SELECT COUNT(*) FROM growth_data")).scalar()
-            logger.info(f"Raw SQL total count (including deleted): {total_raw_count} entries")
-            
-            # Try to see what's actually in the table structure
-            try:
-                sample_rows = db.execute(text("SELECT id, category, value, deleted FROM growth_data LIMIT 5")).fetchall()
-                logger.info(f"Sample rows from growth_data: {sample_rows}")
-            except Exception as e:
-                logger.warning(f"Could not fetch sample rows: {e}")
-            
-            # Check if there are any rows at all, even with different queries
-            try:
-                any_rows = db.execute(text("SELECT 1 FROM growth_data LIMIT 1")).fetchone()
-                logger.info(f"Any rows exist check: {any_rows}")
-            except Exception as e:
-                logger.warning(f"Could not check for any rows: {e}")
-            
-            # Force a fresh connection by creating a new session
-            # This helps if there's a connection pooling or caching issue
-            from .database import SessionLocal
-            fresh_db = SessionLocal()
-            try:
-                fresh_count = fresh_db.execute(text("SELECT COUNT(*) FROM growth_data WHERE deleted = 0")).scalar()
-                logger.info(f"Fresh connection COUNT query returned: {fresh_count} entries")
-                
-                # Also try fetching sample rows with fresh connection
-                fresh_samples = fresh_db.execute(text("SELECT id, category, value FROM growth_data LIMIT 3")).fetchall()
-                logger.info(f"Fresh connection sample rows: {fresh_samples}")
-            except Exception as e:
-                logger.warning(f"Fresh connection query failed: {e}")
-            finally:
-                fresh_db.close()
-            
-            # Also try SQLAlchemy query
-            total_count = db.query(GrowthData).count()
-            logger.info(f"SQLAlchemy query count: {total_count}")
-            
-            # Try raw SQL select
-            raw_select = db.execute(text("SELECT * FROM growth_data WHERE deleted = 0 ORDER BY ts"))
-            raw_rows = raw_select.fetchall()
-            logger.info(f"Raw SQL SELECT returned {len(raw_rows)} rows")
-            
-            # SQLAlchemy query
-            stmt = select(GrowthData).where(GrowthData.deleted == False).order_by(GrowthData.ts)
-            data_list = list(db.scalars(stmt).all())
-            logger.info(f"SQLAlchemy query returned {len(data_list)} non-deleted entries from growth_data table")
-            
-            # If SQLAlchemy returns 0 but raw SQL returns data, use raw SQL
-            if len(data_list) == 0 and len(raw_rows) > 0:
-                logger.warning("SQLAlchemy query returned 0 but raw SQL found data - using raw SQL results")
-                # Convert raw rows to GrowthData objects
-                data_list = []
-                for row in raw_rows:
-                    gd = GrowthData(
-                        id=row[0],
-                        device_id=row[1],
-                        category=row[2],
-                        value=row[3],
-                        unit=row[4],
-                        ts=row[5],
-                        created_ts=row[6],
-                        updated_ts=row[7],
-                        version=row[8],
-                        deleted=bool(row[9]),
-                        server_clock=row[10]
-                    )
-                    data_list.append(gd)
-        else:
-            logger.warning("growth_data table does not exist in database!")
-            data_list = []
-    
-    current_clock = crud.get_clock(db)
+    logger.info(f"Growth pull: category={category}, since={since}, stream={stream}")
+    current_clock, resync_required = await db.run_sync(crud.get_pull_state, device.device_id)
+    if resync_required and since > 0:
+        # Cleared by the device's next full /sync/pull, which it makes after seeing this
+        if stream:
+            return reset_stream(current_clock)
+        return GrowthPullResponse(server_clock=current_clock, data=[], reset=True)
+    etag = clock_etag(current_clock, category=category, since=since, stream=stream)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    if stream:
+        # NDJSON: {"server_clock": N} first, then one GrowthDataDTO per line
+        return StreamingResponse(
+            ndjson_stream({"server_clock": current_clock}, crud.growth_pull_stmt(since, category), growth_to_dto),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=cache_headers(etag),
+        )
+    data_list = await db.run_sync(crud.select_growth_pull, since, category)
+
     logger.info(f"Returning {len(data_list)} growth entries, clock={current_clock}")
+    response.headers.update(cache_headers(etag))
     
-    payload = [
-        GrowthDataDTO(
-            id=gd.id,
-            device_id=gd.device_id,
-            category=gd.category,
-            value=gd.value,
-            unit=gd.unit,
-            ts=gd.ts,
-            created_ts=gd.created_ts,
-            updated_ts=gd.updated_ts,
-            version=gd.version,
-            deleted=gd.deleted,
-        ) for gd in data_list
-    ]
+    payload = [growth_to_dto(gd) for gd in data_list]
     
     return GrowthPullResponse(server_clock=current_clock, data=payload)
-
-
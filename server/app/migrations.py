@@ -0,0 +1,45 @@
+from __future__ import annotations
+import logging
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.engine import Engine
+from .database import Base
+
+logger = logging.getLogger(__name__)
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+
+def alembic_config() -> Config:
+    cfg = Config(str(SERVER_DIR / "alembic.ini"))
+    cfg.set_main_option("script_location", str(SERVER_DIR / "alembic"))
+    return cfg
+
+
+def head_revision(cfg: Config | None = None) -> str | None:
+    return ScriptDirectory.from_config(cfg or alembic_config()).get_current_head()
+
+
+def current_revision(engine: Engine) -> str | None:
+    with engine.connect() as conn:
+        return MigrationContext.configure(conn).get_current_revision()
+
+
+def ensure_schema(engine: Engine) -> bool:
+    """Upgrade the database to the latest migration. Returns True if anything ran."""
+    cfg = alembic_config()
+    head = head_revision(cfg)
+    current = current_revision(engine)
+    if current == head:
+        logger.info(f"Database schema is current (revision {current})")
+        return False
+
+    logger.info(f"Upgrading database schema from {current} to {head}")
+    with engine.begin() as conn:
+        cfg.attributes["connection"] = conn
+        cfg.attributes["target_metadata"] = Base.metadata
+        command.upgrade(cfg, "head")
+    return True
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import Integer, String, JSON, Boolean, Float
+from sqlalchemy import Index, Integer, String, JSON, Boolean, Float, func
 from sqlalchemy.orm import Mapped, mapped_column
 from .database import Base
 
@@ -11,7 +11,7 @@ class Device(Base):
     name: Mapped[str | None] = mapped_column(String, nullable=True)
     created_ts: Mapped[int] = mapped_column(Integer, nullable=False)
     last_seen_ts: Mapped[int] = mapped_column(Integer, nullable=False)
-    token_hash: Mapped[str] = mapped_column(String, nullable=False)
+    token_hash: Mapped[str] = mapped_column(String, nullable=False, index=True)
     enabled: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
 
 
@@ -30,7 +30,15 @@ class Event(Base):
     version: Mapped[int] = mapped_column(Integer, nullable=False)
     deleted: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     device_id: Mapped[str] = mapped_column(String, nullable=False)
-    server_clock: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    server_clock: Mapped[int] = mapped_column(Integer, nullable=False, default=0, index=True)
+
+    __table_args__ = (
+        # Rollup recomputation reads one type's events for one local day, keyed like the phone's day view
+        Index("ix_events_type_day_ts", "type", func.coalesce(start_ts, ts)),
+        # GET /events windows: timed events by start (end_ts read from the index), instants by ts
+        Index("ix_events_window", "deleted", "type", "start_ts", "end_ts"),
+        Index("ix_events_window_ts", "deleted", "type", "ts"),
+    )
 
 
 class Watermark(Base):
@@ -39,6 +47,8 @@ class Watermark(Base):
     device_id: Mapped[str] = mapped_column(String, primary_key=True)
     last_clock: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     updated_ts: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Set when compaction removed tombstones this device had not pulled yet
+    resync_required: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
 
 class ServerClock(Base):
@@ -53,14 +63,27 @@ class GrowthData(Base):
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     device_id: Mapped[str] = mapped_column(String, nullable=False)
-    category: Mapped[str] = mapped_column(String, nullable=False)  # weight, height, head
+    category: Mapped[str] = mapped_column(String, nullable=False, index=True)  # weight, height, head
     value: Mapped[float] = mapped_column(Float, nullable=False)
     unit: Mapped[str] = mapped_column(String, nullable=False)  # lb, in, cm
-    ts: Mapped[int] = mapped_column(Integer, nullable=False)  # timestamp of measurement
+    ts: Mapped[int] = mapped_column(Integer, nullable=False, index=True)  # timestamp of measurement
     created_ts: Mapped[int] = mapped_column(Integer, nullable=False)
     updated_ts: Mapped[int] = mapped_column(Integer, nullable=False)
     version: Mapped[int] = mapped_column(Integer, nullable=False)
     deleted: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
-    server_clock: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
-
-
+    server_clock: Mapped[int] = mapped_column(Integer, nullable=False, default=0, index=True)
+
+
+class DailyRollup(Base):
+    """Per local day and event type aggregates, kept current by upsert_events."""
+    __tablename__ = "daily_rollups"
+
+    day: Mapped[str] = mapped_column(String, primary_key=True)  # local date, YYYY-MM-DD
+    type: Mapped[str] = mapped_column(String, primary_key=True)  # sleep, feed, nappy
+    count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sleep_seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    nap_seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    night_seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    longest_sleep_seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    bottle_ml: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    solids_amount: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+from sqlalchemy import select
+from .database import AsyncSessionLocal
+from .models import ServerClock
+
+logger = logging.getLogger(__name__)
+
+# How often one task per process re-reads the clock while requests are parked,
+# to see writes committed by other uvicorn workers
+CROSS_PROCESS_POLL_INTERVAL = 1.0
+
+
+class ClockNotifier:
+    """Wakes parked long-poll requests when the server clock advances.
+
+    Writers in this process call notify() after committing. Commits made by other
+    worker processes are noticed by a single poller task that reads the clock once
+    per CROSS_PROCESS_POLL_INTERVAL, and only while at least one request is waiting.
+    """
+
+    def __init__(self, poll_interval: float = CROSS_PROCESS_POLL_INTERVAL) -> None:
+        self.poll_interval = poll_interval
+        self.clock = 0
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._changed: asyncio.Event | None = None
+        self._waiters = 0
+        self._poller: asyncio.Task | None = None
+
+    def notify(self, clock: int) -> None:
+        """Record a committed clock; safe to call from any thread."""
+        with self._lock:
+            if clock <= self.clock:
+                return
+            self.clock = clock
+            loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._changed = asyncio.Event()
+            self._poller = None
+            self._waiters = 0
+
+    async def wait_for(self, since: int, timeout: float) -> int:
+        """Return the clock as soon as it passes `since`, or the current clock on timeout.
+
+        On timeout the clock is read from the database rather than answered from
+        memory: before the first poll this process only knows 0, and a client told
+        a clock below the one it sent might rewind its cursor.
+        """
+        self._bind()
+        self._waiters += 1
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            deadline = self._loop.time() + timeout
+            # self.clock only ever holds committed values, so passing `since` is a real change
+            while self.clock <= since:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if self.clock <= since:
+                await self.refresh()
+            return self.clock
+        finally:
+            self._waiters -= 1
+
+    async def refresh(self) -> None:
+        """Read the committed clock from the database; failures keep the last known one."""
+        try:
+            async with AsyncSessionLocal() as db:
+                counter = await db.scalar(select(ServerClock.counter).where(ServerClock.id == 1))
+            self.notify(counter or 0)
+        except Exception as e:
+            logger.warning(f"Clock poll failed: {e}")
+
+    async def _poll(self) -> None:
+        while self._waiters > 0:
+            await self.refresh()
+            await asyncio.sleep(self.poll_interval)
+
+
+notifier = ClockNotifier()
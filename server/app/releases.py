@@ -0,0 +1,154 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+APK_DIR = Path(os.getenv("TCB_APK_DIR", SERVER_DIR / "apks"))
+# Written next to the APK by ./release_application
+MANIFEST_FILENAME = "release.json"
+DEFAULT_APK_FILENAME = "latest.apk"
+# Served when no manifest exists yet
+DEFAULT_VERSION_CODE = 32
+DEFAULT_VERSION_NAME = "1.5.2"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class ApkFile:
+    name: str
+    path: Path
+    size: int
+    mtime: float
+    sha256: str
+
+
+@dataclass(frozen=True)
+class Release:
+    version_code: int
+    version_name: str
+    apk_filename: str
+    apk: ApkFile | None
+    release_notes: str | None
+    commit_message: str | None
+    mandatory: bool
+
+
+def _stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_build_commit_message() -> str | None:
+    """TCB_COMMIT_MESSAGE if set, else the subject of `git log -1` in the checkout."""
+    message = os.getenv("TCB_COMMIT_MESSAGE")
+    if message:
+        return message
+    import subprocess
+    try:
+        result = subprocess.run(
+            ["git", "log", "-1", "--pretty=format:%s"],
+            cwd=SERVER_DIR.parent,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Failed to get commit message: {e}")
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+class ReleaseCatalog:
+    """Release manifest and APK checksums, re-read only when a file's mtime or size changes."""
+
+    def __init__(self, apk_dir: Path = APK_DIR) -> None:
+        self.apk_dir = apk_dir
+        self._lock = threading.Lock()
+        self._apks: dict[str, tuple[tuple[int, int], ApkFile]] = {}
+        self._release: tuple[tuple, Release] | None = None
+        # Fallback for manifests without a commit_message; read once at startup, so it
+        # describes the deployed checkout and no request waits on git
+        self.build_commit_message: str | None = None
+
+    def load_build_commit_message(self) -> None:
+        self.build_commit_message = read_build_commit_message()
+
+    def apk(self, filename: str) -> ApkFile | None:
+        path = self.apk_dir / filename
+        stamp = _stamp(path)
+        if stamp is None or not path.is_file():
+            return None
+        with self._lock:
+            cached = self._apks.get(filename)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+        # Hash outside the lock; a concurrent reload of the same file is harmless
+        apk = ApkFile(name=filename, path=path, size=stamp[1], mtime=stamp[0] / 1e9, sha256=_sha256(path))
+        logger.info(f"Hashed {filename}: {apk.size} bytes, sha256 {apk.sha256}")
+        with self._lock:
+            self._apks[filename] = (stamp, apk)
+        return apk
+
+    def current(self) -> Release:
+        manifest_path = self.apk_dir / MANIFEST_FILENAME
+        manifest_stamp = _stamp(manifest_path)
+        with self._lock:
+            cached = self._release
+        data = None
+        if cached is not None and cached[0][0] == manifest_stamp:
+            filename = cached[1].apk_filename
+        else:
+            data = self._manifest(manifest_path)
+            filename = data.get("apk", DEFAULT_APK_FILENAME)
+        key = (manifest_stamp, _stamp(self.apk_dir / filename))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        if data is None:
+            data = self._manifest(manifest_path)
+        release = Release(
+            version_code=int(data.get("version_code", DEFAULT_VERSION_CODE)),
+            version_name=str(data.get("version_name", DEFAULT_VERSION_NAME)),
+            apk_filename=filename,
+            apk=self.apk(filename),
+            release_notes=data.get("release_notes"),
+            commit_message=data.get("commit_message") or self.build_commit_message,
+            mandatory=bool(data.get("mandatory", False)),
+        )
+        with self._lock:
+            self._release = (key, release)
+        return release
+
+    @staticmethod
+    def _manifest(path: Path) -> dict:
+        try:
+            with path.open() as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable release manifest {path}: {e}")
+            return {}
+
+
+release_catalog = ReleaseCatalog()
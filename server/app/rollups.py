@@ -0,0 +1,225 @@
+"""Per local day, per event type statistics, maintained alongside the events table.
+
+The rules mirror the app's StatsUseCases/TimeRules: an event belongs to the
+local day of its start_ts (else ts), only non-deleted events count, and a sleep
+is "night" when it starts between 19:00 and 07:00 and lasts at least two hours.
+
+Rebuild everything (e.g. after a bulk import) with:
+
+    python -m app.rollups rebuild
+"""
+from __future__ import annotations
+import argparse
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Tuple
+from zoneinfo import ZoneInfo
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from .models import DailyRollup, Event
+
+logger = logging.getLogger(__name__)
+
+# Local days follow this zone; unset means the server's own local time, like the app's systemDefault()
+ROLLUP_TIMEZONE = os.getenv("TCB_TIMEZONE")
+NIGHT_START_HOUR = 19
+NIGHT_END_HOUR = 7
+NIGHT_MIN_SECONDS = 2 * 3600
+ROLLUP_TYPES = ("sleep", "feed", "nappy")
+REBUILD_BATCH_SIZE = 1000
+# Touched days closer together than this are recomputed with one query over the days between
+RECOMPUTE_MAX_GAP_DAYS = 7
+
+RollupKey = Tuple[date, str]
+
+
+def _zone() -> ZoneInfo | None:
+    return ZoneInfo(ROLLUP_TIMEZONE) if ROLLUP_TIMEZONE else None
+
+
+def local_datetime(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, tz=_zone())
+
+
+def day_bounds(day: date) -> tuple[int, int]:
+    """[start, end) epoch seconds of a local day; 23 or 25 hours long across DST changes."""
+    zone = _zone()
+    start = datetime.combine(day, time.min, tzinfo=zone)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=zone)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def is_night_sleep(start_ts: int, end_ts: int) -> bool:
+    hour = local_datetime(start_ts).hour
+    return (hour >= NIGHT_START_HOUR or hour < NIGHT_END_HOUR) and end_ts - start_ts >= NIGHT_MIN_SECONDS
+
+
+def rollup_key(ev: Event) -> RollupKey | None:
+    """The (day, type) row an event counts towards, or None if it counts nowhere."""
+    if ev.deleted or ev.type not in ROLLUP_TYPES:
+        return None
+    if ev.ts is None and (ev.start_ts is None or ev.end_ts is None):
+        return None  # an ongoing timer; the app's day view skips these too
+    anchor = ev.start_ts if ev.start_ts is not None else ev.ts
+    return local_datetime(anchor).date(), ev.type
+
+
+def _payload_int(payload: dict | None, key: str) -> int:
+    value = (payload or {}).get(key)
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+    return 0
+
+
+def _empty_row(key: RollupKey) -> dict:
+    return {
+        "day": key[0].isoformat(),
+        "type": key[1],
+        "count": 0,
+        "sleep_seconds": 0,
+        "nap_seconds": 0,
+        "night_seconds": 0,
+        "longest_sleep_seconds": 0,
+        "bottle_ml": 0,
+        "solids_amount": 0,
+    }
+
+
+def _accumulate(row: dict, ev: Event) -> None:
+    row["count"] += 1
+    if ev.type == "sleep" and ev.start_ts is not None and ev.end_ts is not None:
+        duration = ev.end_ts - ev.start_ts
+        row["sleep_seconds"] += duration
+        row["longest_sleep_seconds"] = max(row["longest_sleep_seconds"], duration)
+        if is_night_sleep(ev.start_ts, ev.end_ts):
+            row["night_seconds"] += duration
+        else:
+            row["nap_seconds"] += duration
+    elif ev.type == "feed":
+        row["bottle_ml"] += _payload_int(ev.payload, "bottle_amount_ml")
+        row["solids_amount"] += _payload_int(ev.payload, "solids_amount")
+
+
+def _range_events_stmt(first: date, last: date, types: Iterable[str]):
+    """Countable events of `types` anchored on local days first..last inclusive."""
+    start = day_bounds(first)[0]
+    end = day_bounds(last)[1]
+    anchor = func.coalesce(Event.start_ts, Event.ts)
+    return select(Event).where(
+        Event.type.in_(sorted(types)),
+        anchor >= start,
+        anchor < end,
+        Event.deleted == False,
+        or_(and_(Event.start_ts != None, Event.end_ts != None), Event.ts != None),
+    )
+
+
+def _day_ranges(days: Iterable[date]) -> list[tuple[date, date]]:
+    """Sorted days grouped into inclusive ranges, split wherever the gap exceeds RECOMPUTE_MAX_GAP_DAYS."""
+    ranges: list[list[date]] = []
+    for day in sorted(set(days)):
+        if ranges and (day - ranges[-1][1]).days <= RECOMPUTE_MAX_GAP_DAYS:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [(first, last) for first, last in ranges]
+
+
+def recompute_rollups(session: Session, keys: Iterable[RollupKey]) -> None:
+    """Recompute the given (day, type) rows from events; does not commit.
+
+    Keys are grouped into runs of nearby days, and each run is rebuilt from a
+    single query and written back with one delete and one bulk insert, so a
+    push spanning years of history costs a few statements rather than two per day.
+    """
+    session.flush()  # the sessionmakers do not autoflush, and the queries must see this batch
+    keys = set(keys)
+    for first, last in _day_ranges(day for day, _ in keys):
+        types = {type for day, type in keys if first <= day <= last}
+        rows: dict[RollupKey, dict] = {}
+        for ev in session.scalars(_range_events_stmt(first, last, types)):
+            key = rollup_key(ev)
+            if key is None:
+                continue
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = _empty_row(key)
+            _accumulate(row, ev)
+        # Every (day, type) in the run was recomputed, so the run's rows are replaced wholesale
+        session.execute(delete(DailyRollup).where(
+            DailyRollup.day >= first.isoformat(),
+            DailyRollup.day <= last.isoformat(),
+            DailyRollup.type.in_(sorted(types)),
+        ))
+        if rows:
+            session.execute(sqlite_insert(DailyRollup), list(rows.values()))
+
+
+def rebuild_rollups(session: Session, bump_clock: bool = True) -> int:
+    """Replace every rollup row from a single pass over events. Returns the number of rows written.
+
+    No event changes, so when the rows come out different the rebuild takes a
+    clock of its own; otherwise /stats would keep answering 304 with the old
+    numbers. An identical rebuild, or one with `bump_clock=False`, leaves the
+    clock alone so devices have nothing to re-pull.
+    """
+    from .crud import reserve_clocks
+    from .notify import notifier
+
+    reserve_clocks(session, 0)  # take the write lock before reading
+    rows: dict[RollupKey, dict] = {}
+    stmt = select(Event).where(Event.deleted == False).execution_options(yield_per=REBUILD_BATCH_SIZE)
+    for ev in session.scalars(stmt):
+        key = rollup_key(ev)
+        if key is None:
+            continue
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = _empty_row(key)
+        _accumulate(row, ev)
+    if _stored_rows(session) == {(row["day"], row["type"]): row for row in rows.values()}:
+        session.commit()
+        return len(rows)
+    session.execute(delete(DailyRollup))
+    if rows:
+        session.execute(sqlite_insert(DailyRollup), list(rows.values()))
+    clock = reserve_clocks(session, 1) if bump_clock else None
+    session.commit()
+    if clock is not None:
+        notifier.notify(clock)
+    return len(rows)
+
+
+def _stored_rows(session: Session) -> dict[tuple[str, str], dict]:
+    table = DailyRollup.__table__
+    return {(row["day"], row["type"]): dict(row) for row in session.execute(select(table)).mappings()}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain the daily_rollups table")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("rebuild", help="Recompute every rollup row from events")
+    parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    from .database import SessionLocal
+    session = SessionLocal()
+    try:
+        written = rebuild_rollups(session)
+    finally:
+        session.close()
+    logger.info(f"Rebuilt {written} daily rollup rows")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
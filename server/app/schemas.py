@@ -39,9 +39,41 @@ class SyncPushResponse(BaseModel):
     results: List[SyncPushResponseItem]
 
 
+class SyncPushAck(BaseModel):
+    event_id: str
+    applied: bool
+    server_clock: int
+    # Only present when the server's copy won the conflict and the client must adopt it
+    event: Optional[EventDTO] = None
+
+
+class SyncPushAckResponse(BaseModel):
+    server_clock: int
+    results: List[SyncPushAck]
+
+
 class SyncPullResponse(BaseModel):
     server_clock: int
     events: List[EventDTO]
+    # Only set for paginated pulls: the `since` to request next, and whether more pages remain
+    next_since: Optional[int] = None
+    has_more: bool = False
+    # Tombstones this device had not seen were compacted away: discard synced rows and pull from since=0
+    reset: bool = False
+
+
+class EventWindowResponse(BaseModel):
+    server_clock: int
+    events: List[EventDTO]
+    # Pass as `cursor` to get the next page; None once the window is exhausted
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
+
+class SyncWaitResponse(BaseModel):
+    server_clock: int
+    # False when the wait timed out with nothing newer than `since`
+    changed: bool
 
 
 class UpdateInfoResponse(BaseModel):
@@ -51,6 +83,9 @@ class UpdateInfoResponse(BaseModel):
     release_notes: Optional[str] = None
     commit_message: Optional[str] = None
     mandatory: bool = False
+    # Of the APK behind download_url; None when it has not been uploaded yet
+    sha256: Optional[str] = None
+    size_bytes: Optional[int] = None
 
 
 class GrowthDataDTO(BaseModel):
@@ -72,8 +107,159 @@ class GrowthPushResponse(BaseModel):
     data: GrowthDataDTO
 
 
+class GrowthPushAck(BaseModel):
+    id: str
+    applied: bool
+    server_clock: int
+    # Only present when the server's copy won the conflict and the client must adopt it
+    data: Optional[GrowthDataDTO] = None
+
+
+class GrowthBatchResponse(BaseModel):
+    server_clock: int
+    results: List[GrowthPushAck]
+
+
 class GrowthPullResponse(BaseModel):
     server_clock: int
     data: List[GrowthDataDTO]
+    reset: bool = False  # see SyncPullResponse.reset
+
+
+class GrowthPercentilePoint(BaseModel):
+    id: str
+    ts: int
+    value: float
+    unit: str
+    age_months: float  # since the category's first measurement
+    # None when the unit is not one the WHO tables can be converted from
+    z_score: Optional[float] = None
+    percentile: Optional[float] = None
+    # Measurement at each of reference_percentiles for this age, in the row's unit
+    reference_values: Optional[List[Optional[float]]] = None
+
+
+class GrowthPercentilesResponse(BaseModel):
+    server_clock: int  # highest server_clock among the category's rows
+    category: Literal["weight", "height"]
+    reference_percentiles: List[float]
+    points: List[GrowthPercentilePoint]
+
+
+class IntervalStats(BaseModel):
+    count: int
+    # All None when count is 0
+    mean: Optional[float] = None
+    median: Optional[float] = None
+    p10: Optional[float] = None
+    p90: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class HistogramDTO(BaseModel):
+    bin_edges_seconds: List[int]
+    counts: List[int]  # values past the last edge are counted in the last bin
+
+
+class LongestSleepStats(IntervalStats):
+    nights_with_long_sleep: int = 0  # nights whose longest sleep counts as a night sleep
+
+
+class SleepAnalytics(BaseModel):
+    durations: IntervalStats
+    histogram: HistogramDTO
+    start_hour_counts: List[int]  # local hour 0-23
+    longest_per_night: LongestSleepStats  # nights run noon to noon
+
+
+class FeedIntervalStats(IntervalStats):
+    histogram: HistogramDTO
+
+
+class DaySeconds(BaseModel):
+    day: str  # YYYY-MM-DD
+    seconds: float
+
+
+class MonthSeconds(BaseModel):
+    month: str  # YYYY-MM
+    seconds: float
+
+
+class DailySleepTrend(BaseModel):
+    days: int
+    rolling_days: int
+    rolling_mean: List[DaySeconds]  # labelled with the last day of each window
+    monthly_mean: List[MonthSeconds]
+    trend_seconds_per_day: Optional[float] = None
+
+
+class AnalyticsResponse(BaseModel):
+    server_clock: int
+    from_ts: Optional[int] = None
+    to_ts: Optional[int] = None
+    events: int
+    sleep: SleepAnalytics
+    wake_windows: IntervalStats
+    feed_intervals: FeedIntervalStats
+    daily_sleep: DailySleepTrend
+
+
+class DeviceWatermark(BaseModel):
+    device_id: str
+    name: Optional[str] = None
+    last_clock: int
+    updated_ts: Optional[int] = None  # None if the device has never pulled or pushed
+
+
+class WatermarkSummaryResponse(BaseModel):
+    server_clock: int
+    # Lowest/highest acknowledged clock across enabled devices; None when no device is paired
+    min_clock: Optional[int] = None
+    max_clock: Optional[int] = None
+    devices: List[DeviceWatermark]
+
+
+class CompactionReport(BaseModel):
+    dry_run: bool
+    watermark: int  # lowest acknowledged clock across enabled devices
+    retention_before: Optional[int] = None
+    events_removed: int
+    growth_removed: int
+    horizon: int  # newest clock among the removed tombstones
+    devices_reset: List[str]  # devices that must restart from since=0
+    server_clock: int
+
+
+class SleepStatsDTO(BaseModel):
+    count: int = 0
+    total_seconds: int = 0
+    nap_seconds: int = 0
+    night_seconds: int = 0
+    longest_stretch_seconds: int = 0
+
+
+class FeedStatsDTO(BaseModel):
+    count: int = 0
+    bottle_ml_total: int = 0
+    solids_amount_total: int = 0
+
+
+class NappyStatsDTO(BaseModel):
+    count: int = 0
+
+
+class StatsBucket(BaseModel):
+    start: str  # first local day of the bucket (YYYY-MM-DD); weeks start on Monday
+    sleep: SleepStatsDTO
+    feed: FeedStatsDTO
+    nappy: NappyStatsDTO
 
 
+class StatsResponse(BaseModel):
+    from_day: str
+    to_day: str
+    granularity: Literal["day", "week", "month"]
+    buckets: List[StatsBucket]  # every bucket in the range, including empty ones
+    total: StatsBucket  # the whole range; `start` is from_day
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import logging
+import os
+from sqlalchemy.orm import Session
+from .crud import ensure_server_clock
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+SEED_CSV_PATH = os.getenv(
+    "TCB_SEED_CSV",
+    "/home/blasky/Projects/extractedest-baby/complete_historical_data/screenshot_processed_data_20250916_212254.csv",
+)
+
+
+def seed_database(db: Session, csv_path: str | None = None) -> int:
+    """Seed an empty database with sample data from CSV file. Returns the number of events added."""
+    csv_path = csv_path or SEED_CSV_PATH
+
+    if not os.path.exists(csv_path):
+        logger.warning(f"CSV file not found at {csv_path}")
+        return 0
+
+    # Check if database already has data
+    if db.query(Event.event_id).limit(1).first() is not None:
+        logger.info("Database already has events, skipping seed")
+        return 0
+
+    logger.info("Seeding database with CSV data...")
+    import csv
+    events_added = 0
+
+    try:
+        with open(csv_path, 'r', encoding='utf-8') as csvfile:
+            reader = csv.DictReader(csvfile)
+
+            for row in reader:
+                try:
+                    # Parse date and time
+                    date_str = row['Date']
+                    start_time_str = row['Start'].strip()
+                    end_time_str = row['End'].strip()
+
+                    # Skip entries with missing or empty times
+                    if not start_time_str or not end_time_str:
+                        logger.warning(f"Skipping row with missing times: {row}")
+                        continue
+
+                    # Convert to epoch seconds
+                    # Note: CSV times are in local time (UTC-7), need to convert to UTC
+                    from datetime import datetime, timezone, timedelta
+                    try:
+                        start_datetime = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %I:%M%p")
+                        end_datetime = datetime.strptime(f"{date_str} {end_time_str}", "%Y-%m-%d %I:%M%p")
+                    except ValueError:
+                        # Try alternative format without AM/PM
+                        try:
+                            start_datetime = datetime.strptime(f"{date_str} {start_time_str}", "%Y-%m-%d %I:%M")
+                            end_datetime = datetime.strptime(f"{date_str} {end_time_str}", "%Y-%m-%d %I:%M")
+                        except ValueError:
+                            logger.warning(f"Could not parse times for row: {row}")
+                            continue
+
+                    # Treat parsed datetime as UTC-7 and convert to UTC
+                    tz_utc_minus_7 = timezone(timedelta(hours=-7))
+                    start_aware = start_datetime.replace(tzinfo=tz_utc_minus_7)
+                    end_aware = end_datetime.replace(tzinfo=tz_utc_minus_7)
+                    start_ts = int(start_aware.timestamp())
+                    end_ts = int(end_aware.timestamp())
+
+                    # Map event types
+                    event_type = row['Type']
+                    if event_type == 'sleep':
+                        event_type = 'sleep'
+                    elif event_type == 'feeding':
+                        event_type = 'feed'
+                    elif event_type == 'diaper':
+                        event_type = 'nappy'
+
+                    # Create event
+                    event = Event(
+                        event_id=f"seed_{events_added}_{start_ts}",
+                        type=event_type,
+                        payload={
+                            'details': row['Details'],
+                            'raw_text': row['Raw_Text']
+                        },
+                        start_ts=start_ts,
+                        end_ts=end_ts,
+                        ts=start_ts,  # Use start time as the main timestamp
+                        created_ts=start_ts,
+                        updated_ts=start_ts,
+                        version=1,
+                        deleted=False,
+                        device_id="seed_device",
+                        server_clock=events_added + 1  # Assign sequential server clock values
+                    )
+
+                    db.add(event)
+                    events_added += 1
+
+                    if events_added % 100 == 0:
+                        db.commit()
+                        logger.info(f"Added {events_added} events...")
+
+                except Exception as e:
+                    logger.warning(f"Failed to process row {row}: {e}")
+                    continue
+
+            db.commit()
+            
+            # Update server clock to match the highest server_clock assigned to seeded events
+            server_clock = ensure_server_clock(db)
+            server_clock.counter = events_added
+            db.add(server_clock)
+            db.commit()
+            
+            logger.info(f"Successfully seeded database with {events_added} events")
+
+    except Exception as e:
+        logger.error(f"Failed to seed database: {e}")
+    return events_added
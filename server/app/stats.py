@@ -0,0 +1,101 @@
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Iterator
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .models import DailyRollup
+from .schemas import FeedStatsDTO, NappyStatsDTO, SleepStatsDTO, StatsBucket
+
+# Every bucket in the range is built in memory, empty or not; about three years of days
+MAX_STATS_BUCKETS = 1100
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def bucket_count(from_day: date, to_day: date, granularity: str) -> int:
+    if granularity == "week":
+        return (bucket_start(to_day, "week") - bucket_start(from_day, "week")).days // 7 + 1
+    if granularity == "month":
+        return (to_day.year - from_day.year) * 12 + to_day.month - from_day.month + 1
+    return (to_day - from_day).days + 1
+
+
+def iter_bucket_starts(from_day: date, to_day: date, granularity: str) -> Iterator[date]:
+    current = bucket_start(from_day, granularity)
+    while current <= to_day:
+        yield current
+        try:
+            if granularity == "week":
+                current += timedelta(days=7)
+            elif granularity == "month":
+                current = (current + timedelta(days=32)).replace(day=1)
+            else:
+                current += timedelta(days=1)
+        except OverflowError:
+            # The next bucket would start after date.max
+            return
+
+
+def _bucket_expr(granularity: str):
+    """SQL for the bucket_start() of a rollup's day, so grouping happens in SQLite."""
+    if granularity == "week":
+        return func.date(DailyRollup.day, "weekday 0", "-6 days")
+    if granularity == "month":
+        return func.substr(DailyRollup.day, 1, 7).concat("-01")
+    return DailyRollup.day
+
+
+def select_stats_buckets(session: Session, from_day: date, to_day: date, granularity: str) -> list:
+    """Rollup rows in [from_day, to_day] summed per bucket and type; reads only daily_rollups."""
+    bucket = _bucket_expr(granularity).label("bucket")
+    stmt = (
+        select(
+            bucket,
+            DailyRollup.type,
+            func.sum(DailyRollup.count),
+            func.sum(DailyRollup.sleep_seconds),
+            func.sum(DailyRollup.nap_seconds),
+            func.sum(DailyRollup.night_seconds),
+            func.max(DailyRollup.longest_sleep_seconds),
+            func.sum(DailyRollup.bottle_ml),
+            func.sum(DailyRollup.solids_amount),
+        )
+        .where(DailyRollup.day >= from_day.isoformat(), DailyRollup.day <= to_day.isoformat())
+        .group_by(bucket, DailyRollup.type)
+    )
+    return list(session.execute(stmt).all())
+
+
+def _empty_bucket(start: str) -> StatsBucket:
+    return StatsBucket(start=start, sleep=SleepStatsDTO(), feed=FeedStatsDTO(), nappy=NappyStatsDTO())
+
+
+def _add(target: StatsBucket, type_: str, count, sleep, nap, night, longest, bottle, solids) -> None:
+    if type_ == "sleep":
+        target.sleep.count += count
+        target.sleep.total_seconds += sleep
+        target.sleep.nap_seconds += nap
+        target.sleep.night_seconds += night
+        target.sleep.longest_stretch_seconds = max(target.sleep.longest_stretch_seconds, longest)
+    elif type_ == "feed":
+        target.feed.count += count
+        target.feed.bottle_ml_total += bottle
+        target.feed.solids_amount_total += solids
+    elif type_ == "nappy":
+        target.nappy.count += count
+
+
+def build_buckets(rows: list, from_day: date, to_day: date, granularity: str) -> tuple[list[StatsBucket], StatsBucket]:
+    buckets = {start.isoformat(): _empty_bucket(start.isoformat())
+               for start in iter_bucket_starts(from_day, to_day, granularity)}
+    total = _empty_bucket(from_day.isoformat())
+    for bucket, type_, *values in rows:
+        _add(buckets[bucket], type_, *values)
+        _add(total, type_, *values)
+    return list(buckets.values()), total
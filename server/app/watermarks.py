@@ -0,0 +1,32 @@
+from __future__ import annotations
+import threading
+
+# With an unchanged clock, a device's last-seen time is rewritten at most this often (seconds)
+WATERMARK_TOUCH_INTERVAL = 300
+
+
+class WatermarkTracker:
+    """Remembers what this process last wrote per device, so repeat polls skip the write."""
+
+    def __init__(self, touch_interval: int = WATERMARK_TOUCH_INTERVAL) -> None:
+        self.touch_interval = touch_interval
+        self._written: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def needs_write(self, device_id: str, clock: int, now: int) -> bool:
+        with self._lock:
+            previous = self._written.get(device_id)
+        if previous is None:
+            return True
+        last_clock, last_ts = previous
+        return clock > last_clock or now - last_ts >= self.touch_interval
+
+    def mark(self, device_id: str, clock: int, now: int) -> None:
+        with self._lock:
+            previous = self._written.get(device_id)
+            if previous is not None:
+                clock = max(clock, previous[0])
+            self._written[device_id] = (clock, now)
+
+
+watermark_tracker = WatermarkTracker()
@@ -0,0 +1,188 @@
+"""app.analytics against a plain-Python reference on a synthetic multi-year history.
+
+The reference is the loop-over-ORM-objects version of the same report, the way
+these analyses were done by hand; tests use it to check the vectorized code.
+
+    python -m benchmarks.analytics [--years 3] [--repeat 3]
+"""
+from __future__ import annotations
+import argparse
+import math
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+from app.analytics import (
+    DEFAULT_ROLLING_DAYS, FEED_INTERVAL_HISTOGRAM_EDGES, NIGHT_OFFSET_SECONDS, PERCENTILES,
+    SLEEP_HISTOGRAM_EDGES, analyze, load_event_arrays,
+)
+from app.migrations import ensure_schema
+from app.models import Event
+from app.rollups import NIGHT_MIN_SECONDS, local_datetime
+
+HISTORY_START = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+def synthetic_history(days: int, seed: int = 1) -> list[dict]:
+    """Event rows for `days` days: a night sleep with a waking, naps, feeds every few hours, nappies."""
+    rng = random.Random(seed)
+    rows: list[dict] = []
+
+    def add(type: str, **times) -> None:
+        t = times.get("start_ts") or times["ts"]
+        rows.append({"event_id": f"e{len(rows)}", "type": type, "created_ts": t, "updated_ts": t,
+                     "version": 1, "deleted": rng.random() < 0.01, "device_id": "bench", **times})
+
+    for day in range(days):
+        midnight = int((HISTORY_START + timedelta(days=day)).timestamp())
+        bedtime = midnight + 19 * 3600 + rng.randrange(0, 90 * 60, 60)
+        waking = bedtime + rng.randrange(3 * 3600, 6 * 3600, 60)
+        add("sleep", start_ts=bedtime, end_ts=waking)
+        add("sleep", start_ts=waking + rng.randrange(10 * 60, 50 * 60, 60),
+            end_ts=midnight + 30 * 3600 + rng.randrange(0, 90 * 60, 60))
+        for nap_hour in rng.sample([9, 12, 15], k=rng.choice([1, 2, 3])):
+            start = midnight + nap_hour * 3600 + rng.randrange(0, 60 * 60, 60)
+            add("sleep", start_ts=start, end_ts=start + rng.randrange(20 * 60, 150 * 60, 60))
+        feed = midnight + 6 * 3600
+        while feed < midnight + 21 * 3600:
+            add("feed", ts=feed, payload={"bottle_amount_ml": rng.randrange(60, 240, 10)})
+            feed += rng.randrange(int(2.5 * 3600), 4 * 3600, 60)
+        for _ in range(rng.randrange(4, 9)):
+            add("nappy", ts=midnight + rng.randrange(6 * 3600, 22 * 3600, 60))
+    return rows
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    pos = (len(ordered) - 1) * q / 100
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def _stats(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    p10, p50, p90 = (_percentile(ordered, q) for q in PERCENTILES)
+    return {"count": len(values), "mean": sum(values) / len(values), "median": p50, "p10": p10,
+            "p90": p90, "min": float(ordered[0]), "max": float(ordered[-1])}
+
+
+def _histogram(values: list[int], edges) -> dict:
+    width, bins = int(edges[1] - edges[0]), len(edges) - 1
+    counts = [0] * bins
+    for v in values:
+        counts[min(max(v, 0) // width, bins - 1)] += 1
+    return {"bin_edges_seconds": [int(e) for e in edges], "counts": counts}
+
+
+def reference_report(events: list[Event], rolling_days: int = DEFAULT_ROLLING_DAYS) -> dict:
+    def anchor(ev: Event):
+        return ev.start_ts if ev.start_ts is not None else ev.ts
+
+    events = sorted((ev for ev in events if not ev.deleted and anchor(ev) is not None), key=anchor)
+    sleeps = [ev for ev in events if ev.type == "sleep" and ev.start_ts is not None and ev.end_ts is not None]
+    durations = [ev.end_ts - ev.start_ts for ev in sleeps]
+    wake_windows = [cur.start_ts - prev.end_ts for prev, cur in zip(sleeps, sleeps[1:])
+                    if cur.start_ts - prev.end_ts > 0]
+    feeds = [anchor(ev) for ev in events if ev.type == "feed"]
+    feed_intervals = [b - a for a, b in zip(feeds, feeds[1:]) if b - a > 0]
+
+    hours = [0] * 24
+    longest: dict = {}
+    totals: dict = {}
+    for ev, duration in zip(sleeps, durations):
+        local = local_datetime(ev.start_ts).replace(tzinfo=None)
+        hours[local.hour] += 1
+        night = (local - timedelta(seconds=NIGHT_OFFSET_SECONDS)).date()
+        longest[night] = max(longest.get(night, 0), duration)
+        totals[local.date()] = totals.get(local.date(), 0) + duration
+
+    daily: dict = {"days": 0, "rolling_days": rolling_days, "rolling_mean": [], "monthly_mean": [],
+                   "trend_seconds_per_day": None}
+    if totals:
+        first, last = min(totals), max(totals)
+        days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+        series = [float(totals.get(d, 0)) for d in days]
+        daily["days"] = len(series)
+        for i in range(rolling_days - 1, len(series)):
+            window = series[i - rolling_days + 1:i + 1]
+            daily["rolling_mean"].append({"day": days[i].isoformat(), "seconds": sum(window) / rolling_days})
+        if len(series) >= 2:
+            x_mean, y_mean = (len(series) - 1) / 2, sum(series) / len(series)
+            num = sum((x - x_mean) * (y - y_mean) for x, y in enumerate(series))
+            den = sum((x - x_mean) ** 2 for x in range(len(series)))
+            daily["trend_seconds_per_day"] = num / den
+        months: dict = {}
+        for d, total in zip(days, series):
+            months.setdefault(d.strftime("%Y-%m"), []).append(total)
+        daily["monthly_mean"] = [{"month": m, "seconds": sum(v) / len(v)} for m, v in months.items()]
+
+    nights = list(longest.values())
+    return {
+        "events": len(events),
+        "sleep": {
+            "durations": _stats(durations),
+            "histogram": _histogram(durations, SLEEP_HISTOGRAM_EDGES),
+            "start_hour_counts": hours,
+            "longest_per_night": ({**_stats(nights), "nights_with_long_sleep":
+                                   sum(1 for v in nights if v >= NIGHT_MIN_SECONDS)} if nights else {"count": 0}),
+        },
+        "wake_windows": _stats(wake_windows),
+        "feed_intervals": {**_stats(feed_intervals), "histogram": _histogram(feed_intervals, FEED_INTERVAL_HISTOGRAM_EDGES)},
+        "daily_sleep": daily,
+    }
+
+
+def populate(session: Session, rows: list[dict]) -> None:
+    session.execute(insert(Event), rows)
+    session.commit()
+
+
+def _timed(fn, repeat: int) -> tuple[float, dict]:
+    best, result = math.inf, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark app.analytics against the loop reference")
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        ensure_schema(engine)
+        session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+        populate(session, synthetic_history(int(args.years * 365)))
+
+        def reference():
+            session.expunge_all()
+            return reference_report(list(session.scalars(select(Event))))
+
+        def vectorized():
+            return analyze(load_event_arrays(session))
+
+        ref_seconds, expected = _timed(reference, args.repeat)
+        vec_seconds, actual = _timed(vectorized, args.repeat)
+        arrays = load_event_arrays(session)
+        analyze_seconds, _ = _timed(lambda: analyze(arrays), args.repeat)
+        session.close()
+        engine.dispose()
+
+    assert actual["events"] == expected["events"]
+    print(f"events: {actual['events']}  ({args.years:g} years, best of {args.repeat})")
+    print(f"  reference (ORM + loops): {ref_seconds * 1000:8.1f} ms")
+    print(f"  vectorized (load+stats): {vec_seconds * 1000:8.1f} ms  ({ref_seconds / vec_seconds:.1f}x)")
+    print(f"  vectorized (stats only): {analyze_seconds * 1000:8.1f} ms  ({ref_seconds / analyze_seconds:.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
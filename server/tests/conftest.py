@@ -0,0 +1,18 @@
+import os
+import pytest
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_configure(config):
+    # app.database reads TCB_DB_PATH at import, and test modules import the app during
+    # collection, so point it at a fresh database before then; subprocesses inherit it
+    db_dir = config._tmp_path_factory.mktemp("db")
+    os.environ["TCB_DB_PATH"] = str(db_dir / "test.db")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated_database():
+    from app.bootstrap import bootstrap
+
+    # The app no longer migrates at import time, and AsyncClient(app=...) skips startup events
+    bootstrap()
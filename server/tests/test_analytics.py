@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from app import rollups
+from app.analytics import EventArrays, analyze, load_event_arrays
+from app.migrations import ensure_schema
+from app.models import Event
+from benchmarks.analytics import populate, reference_report, synthetic_history
+
+
+def assert_reports_match(actual, expected):
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for key in expected:
+            assert_reports_match(actual[key], expected[key])
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected)
+        for a, e in zip(actual, expected):
+            assert_reports_match(a, e)
+    elif isinstance(expected, float):
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-6)
+    else:
+        assert actual == expected
+
+
+@pytest.mark.parametrize("zone", ["UTC", "America/Boise"])
+def test_vectorized_report_matches_loop_reference(tmp_path, monkeypatch, zone):
+    # Boise crosses two DST changes in the synthetic range, which moves local days and nights
+    monkeypatch.setattr(rollups, "ROLLUP_TIMEZONE", zone)
+    engine = create_engine(f"sqlite:///{tmp_path / 'analytics.db'}")
+    ensure_schema(engine)
+    session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    populate(session, synthetic_history(400, seed=7))
+
+    expected = reference_report(list(session.scalars(select(Event))))
+    arrays = load_event_arrays(session)
+    assert_reports_match(analyze(arrays), expected)
+    assert expected["sleep"]["longest_per_night"]["count"] >= 399
+    assert len(expected["daily_sleep"]["monthly_mean"]) == 14
+
+    # A window is a slice of the same arrays
+    window = arrays.between(arrays.anchor[100], arrays.anchor[500])
+    assert len(window) == 400
+    assert_reports_match(analyze(window, rolling_days=3),
+                         reference_report([ev for ev in session.scalars(select(Event))
+                                           if arrays.anchor[100] <= (ev.start_ts or ev.ts) < arrays.anchor[500]],
+                                          rolling_days=3))
+    session.close()
+    engine.dispose()
+
+
+def test_empty_history():
+    empty = np.empty(0, dtype=np.int64)
+    report = analyze(EventArrays(empty.astype(np.int8), empty, empty, empty))
+    assert report["events"] == 0
+    assert report["sleep"]["durations"] == {"count": 0}
+    assert report["sleep"]["start_hour_counts"] == [0] * 24
+    assert report["daily_sleep"]["trend_seconds_per_day"] is None
@@ -0,0 +1,85 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from app import crud
+from app.database import SQLITE_BUSY_TIMEOUT
+from app.migrations import ensure_schema
+from app.models import Event
+
+WORKERS = 4
+PUSHES_PER_WORKER = 15
+EVENTS_PER_PUSH = 10
+SHARED_EVENT_IDS = [f"shared-{i}" for i in range(5)]
+
+
+def make_session_factory(db_url):
+    engine = create_engine(db_url, connect_args={"timeout": SQLITE_BUSY_TIMEOUT})
+    return sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def push_worker(db_url, worker):
+    """Push batches from one process: private events plus a few ids every worker updates."""
+    Session = make_session_factory(db_url)
+    assigned = []
+    for push in range(PUSHES_PER_WORKER):
+        batch = [
+            Event(
+                event_id=f"w{worker}-p{push}-e{i}",
+                type="nappy",
+                ts=push,
+                created_ts=push,
+                updated_ts=push,
+                version=1,
+                deleted=False,
+                device_id=f"dev-{worker}",
+            )
+            for i in range(EVENTS_PER_PUSH)
+        ]
+        batch += [
+            Event(
+                event_id=event_id,
+                type="feed",
+                ts=push,
+                created_ts=push,
+                updated_ts=push * WORKERS + worker,
+                version=push + 1,
+                deleted=False,
+                device_id=f"dev-{worker}",
+            )
+            for event_id in SHARED_EVENT_IDS
+        ]
+        with Session() as session:
+            results, _ = crud.upsert_events(session, batch)
+            assigned += [ev.server_clock for ev, changed in results if changed]
+    return assigned
+
+
+def test_parallel_pushes_get_unique_clocks(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'clock.db'}"
+    ensure_schema(create_engine(db_url))
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=ctx) as pool:
+        futures = [pool.submit(push_worker, db_url, worker) for worker in range(WORKERS)]
+        assigned = [clock for f in futures for clock in f.result()]
+
+    # No clock was handed out twice, across processes
+    assert len(assigned) == len(set(assigned))
+
+    Session = make_session_factory(db_url)
+    with Session() as session:
+        counter = crud.get_clock(session)
+        private = session.scalar(select(func.count()).where(Event.event_id.not_in(SHARED_EVENT_IDS)))
+        stored = list(session.scalars(select(Event.server_clock)))
+        shared = list(session.scalars(select(Event).where(Event.event_id.in_(SHARED_EVENT_IDS))))
+
+    assert private == WORKERS * PUSHES_PER_WORKER * EVENTS_PER_PUSH
+    assert len(stored) == len(set(stored))
+    # Gaps are allowed, but nothing stored is ahead of the counter
+    assert max(assigned) <= counter
+    assert max(stored) <= counter
+    # Every shared event converged on the highest (version, updated_ts, device_id) pushed
+    for ev in shared:
+        assert ev.version == PUSHES_PER_WORKER
+        assert ev.device_id == f"dev-{WORKERS - 1}"
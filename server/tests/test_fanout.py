@@ -0,0 +1,155 @@
+import asyncio
+import time
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from app import auth
+from app.fanout import OVERFLOW_CLOSE_CODE, REVOKED_CLOSE_CODE, FanoutHub
+from app.main import app
+
+
+class SimulatedSocket:
+    """Stands in for a Starlette WebSocket; `stalled` sockets never finish a send."""
+
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.received: list[str] = []
+        self.close_code: int | None = None
+        self._gone = asyncio.Event()
+
+    async def send_text(self, text: str) -> None:
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.received.append(text)
+
+    async def receive(self) -> dict:
+        await self._gone.wait()
+        return {"type": "websocket.disconnect"}
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        self.close_code = code
+        self._gone.set()
+
+    def disconnect(self) -> None:
+        self._gone.set()
+
+
+async def _no_changes(since: int):
+    return since, None
+
+
+async def _zero() -> int:
+    return 0
+
+
+def make_hub(outbox_size: int) -> FanoutHub:
+    hub = FanoutHub(_no_changes, _zero, outbox_size=outbox_size)
+    # Drive the hub by publishing directly instead of through the clock notifier
+    hub._ensure_pump = lambda: None
+    return hub
+
+
+@pytest.mark.asyncio
+async def test_fanout_delivers_every_message_to_many_sockets():
+    hub = make_hub(outbox_size=8)
+    sockets = [SimulatedSocket() for _ in range(200)]
+    serving = [asyncio.create_task(hub.serve(ws)) for ws in sockets]
+    await asyncio.sleep(0)
+
+    for i in range(20):
+        hub.publish(f"m{i}")
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+
+    assert all(ws.received == [f"m{i}" for i in range(20)] for ws in sockets)
+    for ws in sockets:
+        ws.disconnect()
+    await asyncio.gather(*serving)
+    assert not hub.subscribers
+
+
+@pytest.mark.asyncio
+async def test_fanout_drops_a_stalled_socket_without_buffering_unboundedly():
+    hub = make_hub(outbox_size=4)
+    healthy = [SimulatedSocket() for _ in range(50)]
+    stalled = SimulatedSocket(stalled=True)
+    serving = [asyncio.create_task(hub.serve(ws)) for ws in healthy + [stalled]]
+    await asyncio.sleep(0)
+
+    for i in range(10):
+        hub.publish(f"m{i}")
+        # The stalled socket's outbox never exceeds its bound
+        assert all(sub.outbox.qsize() <= 4 for sub in hub.subscribers)
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+
+    assert stalled.close_code == OVERFLOW_CLOSE_CODE
+    assert len(hub.subscribers) == len(healthy)
+    assert all(len(ws.received) == 10 for ws in healthy)
+    for ws in healthy:
+        ws.disconnect()
+    await asyncio.gather(*serving)
+
+
+@pytest.mark.asyncio
+async def test_close_device_closes_only_that_devices_sockets():
+    hub = make_hub(outbox_size=4)
+    phone, tablet, other = SimulatedSocket(), SimulatedSocket(), SimulatedSocket()
+    serving = [asyncio.create_task(hub.serve(ws, device)) for ws, device in
+               ((phone, "a"), (tablet, "a"), (other, "b"))]
+    await asyncio.sleep(0)
+
+    assert hub.close_device("a") == 2
+    await asyncio.gather(*serving[:2])
+    assert phone.close_code == tablet.close_code == REVOKED_CLOSE_CODE
+    assert other.close_code is None
+    assert set(hub.by_device) == {"b"}
+    assert hub.close_device("a") == 0
+    other.disconnect()
+    await serving[2]
+    assert not hub.subscribers and not hub.by_device
+
+
+def test_websocket_is_closed_when_the_device_is_disabled(monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "test-admin-token")
+    with TestClient(app) as client:
+        device_id = f"dev-{uuid.uuid4()}"
+        token = client.post("/pair", json={"pairing_code": "abc", "device_id": device_id}).json()["token"]
+        with client.websocket_connect("/sync/ws", headers={"Authorization": f"Bearer {token}"}) as ws:
+            r = client.post(f"/admin/devices/{device_id}/disable",
+                            headers={"Authorization": "Bearer test-admin-token"})
+            assert r.status_code == 200
+            with pytest.raises(WebSocketDisconnect) as closed:
+                ws.receive_text()
+            assert closed.value.code == REVOKED_CLOSE_CODE
+
+
+def test_websocket_receives_pushed_events():
+    with TestClient(app) as client:
+        device_id = f"dev-{uuid.uuid4()}"
+        token = client.post("/pair", json={"pairing_code": "abc", "device_id": device_id}).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/sync/ws?token=wrong") as ws:
+                ws.receive_text()
+
+        with client.websocket_connect("/sync/ws", headers=headers) as ws:
+            # Let the hub's pump read its starting clock before pushing
+            time.sleep(0.2)
+            now = int(time.time())
+            ev_id = str(uuid.uuid4())
+            client.post("/sync/push", json=[{
+                "event_id": ev_id,
+                "type": "feed",
+                "start_ts": now - 600,
+                "end_ts": now,
+                "created_ts": now,
+                "updated_ts": now,
+                "version": 1,
+                "device_id": device_id,
+            }], headers=headers)
+            message = ws.receive_json()
+            assert [e["event_id"] for e in message["events"]] == [ev_id]
+            assert message["growth"] == []
@@ -0,0 +1,56 @@
+import math
+import numpy as np
+import pytest
+from app.growth_percentiles import LMS_TABLES, compute_percentiles, probit
+
+DAY = 86400
+
+
+def kotlin_percentile(value_kg_or_cm, age_months, table):
+    """GrowthPercentileCalculator.calculateWeightPercentile/calculateHeightPercentile, one point at a time."""
+    age = min(max(age_months, 0.0), table[-1][0])
+    lower = max(i for i, row in enumerate(table) if row[0] <= age)
+    upper = next(i for i in range(lower, len(table)) if table[i][0] >= age)
+    if lower == upper:
+        l, m, s = table[lower][1:]
+    else:
+        t = (age - table[lower][0]) / (table[upper][0] - table[lower][0])
+        l, m, s = (a + (b - a) * t for a, b in zip(table[lower][1:], table[upper][1:]))
+    z = math.log(value_kg_or_cm / m) / s if abs(l) < 1e-10 else ((value_kg_or_cm / m) ** l - 1) / (l * s)
+    x = z / math.sqrt(2)
+    t = 1 / (1 + 0.3275911 * abs(x))
+    y = 1 - (((((1.061405429 * t - 1.453152027) * t) + 1.421413741) * t - 0.284496736) * t + 0.254829592) \
+        * t * math.exp(-x * x)
+    return 50 * (1 + math.copysign(y, x))
+
+
+@pytest.mark.parametrize("category", ["weight", "height"])
+def test_vectorized_percentiles_match_the_app(category):
+    rng = np.random.default_rng(3)
+    ts = np.sort(rng.integers(0, 40 * 31 * DAY, 200)) + 1_700_000_000
+    ts[0] = 1_700_000_000
+    table = LMS_TABLES[category].tolist()
+    median = np.interp((ts - ts[0]) / DAY / 30.4375, LMS_TABLES[category][:, 0], LMS_TABLES[category][:, 2])
+    values = median * rng.uniform(0.8, 1.2, len(ts))
+
+    result = compute_percentiles(category, ts, values, ["kg" if category == "weight" else "cm"] * len(ts))
+    expected = [kotlin_percentile(v, a, table) for v, a in zip(values, result["age_months"])]
+    np.testing.assert_allclose(result["percentile"], expected, rtol=1e-9)
+    # The 50th percentile curve is the median
+    np.testing.assert_allclose(result["curves"][:, 2], median, rtol=1e-9)
+
+
+def test_units_and_reference_curves():
+    ts = np.array([0, 60 * DAY, 61 * DAY])
+    # Birth weight at the median, in pounds; then an unknown unit
+    values = np.array([3.3464 / 0.45359237, 12.0, 5.0])
+    result = compute_percentiles("weight", ts, values, ["lb", " LBS ", "stone"])
+    assert result["percentile"][0] == pytest.approx(50.0, abs=1e-6)
+    assert result["age_months"][1] == pytest.approx(60 / 30.4375)
+    assert 0 < result["percentile"][1] < 100
+    assert np.isnan(result["percentile"][2])
+    # Curves are in the row's unit and increase with the percentile
+    assert result["curves"][0, 2] == pytest.approx(3.3464 / 0.45359237)
+    assert np.all(np.diff(result["curves"][1]) > 0)
+    assert probit(0.5) == pytest.approx(0.0, abs=1e-9)
+    assert probit(0.95) == pytest.approx(1.6449, abs=1e-3)
@@ -0,0 +1,39 @@
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+from app.database import Base
+from app.migrations import current_revision, ensure_schema, head_revision
+
+
+def test_fresh_database_upgrades_to_head_and_matches_models(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    assert ensure_schema(engine) is True
+    assert current_revision(engine) == head_revision()
+    assert ensure_schema(engine) is False
+
+    with engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+    assert diff == []
+
+
+def test_legacy_database_is_upgraded_in_place(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        # Pre-migration databases: tables from create_all, no indexes, no growth_data yet
+        conn.execute(text(
+            "CREATE TABLE events (event_id VARCHAR PRIMARY KEY, type VARCHAR NOT NULL, details VARCHAR, "
+            "payload JSON, start_ts INTEGER, end_ts INTEGER, ts INTEGER, created_ts INTEGER NOT NULL, "
+            "updated_ts INTEGER NOT NULL, version INTEGER NOT NULL, deleted BOOLEAN NOT NULL, "
+            "device_id VARCHAR NOT NULL, server_clock INTEGER NOT NULL)"
+        ))
+        conn.execute(text(
+            "INSERT INTO events VALUES ('e1', 'sleep', NULL, NULL, 1, 2, NULL, 1, 1, 1, 0, 'd', 7)"
+        ))
+
+    ensure_schema(engine)
+
+    insp = inspect(engine)
+    assert "growth_data" in insp.get_table_names()
+    assert "ix_events_server_clock" in {ix["name"] for ix in insp.get_indexes("events")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT server_clock FROM events WHERE event_id = 'e1'")).scalar() == 7
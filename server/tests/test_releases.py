@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import pytest
+from fastapi.testclient import TestClient
+from httpx import AsyncClient
+from app import releases
+from app.main import app, release_catalog
+from app.releases import ReleaseCatalog
+
+
+def write_manifest(apk_dir, mtime, **fields):
+    path = apk_dir / "release.json"
+    path.write_text(json.dumps(fields))
+    os.utime(path, (mtime, mtime))
+
+
+def test_manifest_and_checksum_are_cached_until_files_change(tmp_path, monkeypatch):
+    hashed = []
+    real_sha256 = releases._sha256
+    monkeypatch.setattr(releases, "_sha256", lambda path: hashed.append(path) or real_sha256(path))
+
+    apk = tmp_path / "latest.apk"
+    apk.write_bytes(b"apk-v1")
+    write_manifest(tmp_path, 1_000, version_code=33, version_name="1.6.0", apk="latest.apk")
+    catalog = ReleaseCatalog(tmp_path)
+    catalog.build_commit_message = "Build 33"
+
+    release = catalog.current()
+    assert (release.version_code, release.version_name) == (33, "1.6.0")
+    assert release.apk.sha256 == hashlib.sha256(b"apk-v1").hexdigest()
+    assert release.apk.size == 6
+    assert release.commit_message == "Build 33"
+    assert catalog.current() is release
+    assert len(hashed) == 1
+
+    apk.write_bytes(b"apk-v2!")
+    write_manifest(tmp_path, 2_000, version_code=34, version_name="1.7.0", apk="latest.apk",
+                   commit_message="Release 1.7.0")
+    release = catalog.current()
+    assert release.version_code == 34
+    assert release.apk.sha256 == hashlib.sha256(b"apk-v2!").hexdigest()
+    assert release.commit_message == "Release 1.7.0"
+    assert len(hashed) == 2
+
+
+def test_missing_manifest_falls_back_to_defaults(tmp_path):
+    release = ReleaseCatalog(tmp_path).current()
+    assert release.version_code == releases.DEFAULT_VERSION_CODE
+    assert release.apk_filename == "latest.apk"
+    assert release.apk is None
+    assert release.commit_message is None
+
+
+def test_build_commit_message_is_read_at_startup(monkeypatch):
+    monkeypatch.setenv("TCB_COMMIT_MESSAGE", "Build 35")
+    monkeypatch.setattr(release_catalog, "build_commit_message", None)
+    # No request has asked for it yet; starting the app reads it
+    with TestClient(app):
+        assert release_catalog.build_commit_message == "Build 35"
+
+
+@pytest.mark.asyncio
+async def test_apk_download_supports_ranges_and_validators(tmp_path, monkeypatch):
+    body = bytes(range(256)) * 40
+    (tmp_path / "latest.apk").write_bytes(body)
+    monkeypatch.setattr(release_catalog, "apk_dir", tmp_path)
+    etag = f'"{hashlib.sha256(body).hexdigest()}"'
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        full = await ac.get("/app/download/latest.apk")
+        assert full.status_code == 200
+        assert full.content == body
+        assert full.headers["etag"] == etag
+        assert full.headers["accept-ranges"] == "bytes"
+        assert "last-modified" in full.headers
+
+        part = await ac.get("/app/download/latest.apk", headers={"Range": "bytes=100-199", "If-Range": etag})
+        assert part.status_code == 206
+        assert part.content == body[100:200]
+        assert part.headers["content-range"] == f"bytes 100-199/{len(body)}"
+        tail = await ac.get("/app/download/latest.apk", headers={"Range": "bytes=-10"})
+        assert tail.content == body[-10:]
+        resumed = await ac.get("/app/download/latest.apk", headers={"Range": "bytes=10000-"})
+        assert resumed.content == body[10000:]
+
+        # A stale If-Range (the APK was replaced) restarts the download from the beginning
+        stale = await ac.get("/app/download/latest.apk", headers={"Range": "bytes=100-", "If-Range": '"old"'})
+        assert stale.status_code == 200 and stale.content == body
+
+        beyond = await ac.get("/app/download/latest.apk", headers={"Range": f"bytes={len(body)}-"})
+        assert beyond.status_code == 416
+        assert beyond.headers["content-range"] == f"bytes */{len(body)}"
+
+        cached = await ac.get("/app/download/latest.apk", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+
+        assert (await ac.get("/app/download/missing.apk")).status_code == 404
+        assert (await ac.get("/app/download/release.json")).status_code == 400
+        assert (await ac.get("/app/download/.hidden.apk")).status_code == 400
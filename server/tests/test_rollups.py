@@ -0,0 +1,119 @@
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import sessionmaker
+from app import crud, rollups
+from app.migrations import ensure_schema
+from app.models import DailyRollup, Event
+
+DAY = date(2024, 5, 14)
+
+
+def at(day: date, hour: int, minute: int = 0) -> int:
+    return int(datetime(day.year, day.month, day.day, hour, minute, tzinfo=timezone.utc).timestamp())
+
+
+def event(event_id, type, version=1, deleted=False, **times) -> Event:
+    return Event(event_id=event_id, type=type, created_ts=0, updated_ts=version, version=version,
+                 deleted=deleted, device_id="dev", **times)
+
+
+def rollup_rows(session) -> dict:
+    rows = session.scalars(select(DailyRollup).order_by(DailyRollup.day, DailyRollup.type))
+    return {
+        (r.day, r.type): (r.count, r.sleep_seconds, r.nap_seconds, r.night_seconds,
+                          r.longest_sleep_seconds, r.bottle_ml, r.solids_amount)
+        for r in rows
+    }
+
+
+def test_upsert_events_maintains_rollups_for_touched_days(tmp_path, monkeypatch):
+    monkeypatch.setattr(rollups, "ROLLUP_TIMEZONE", "UTC")
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollups.db'}")
+    ensure_schema(engine)
+    session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+
+    crud.upsert_events(session, [
+        event("night", "sleep", start_ts=at(DAY, 20), end_ts=at(DAY, 23)),
+        event("nap", "sleep", start_ts=at(DAY, 13), end_ts=at(DAY, 14)),
+        # Starts in the night window but is under two hours, so it is a nap
+        event("short", "sleep", start_ts=at(DAY, 21), end_ts=at(DAY, 22, 30)),
+        event("ongoing", "sleep", start_ts=at(DAY, 15)),
+        event("bottle", "feed", ts=at(DAY, 9), payload={"bottle_amount_ml": "120"}),
+        event("solids", "feed", ts=at(DAY, 12), payload={"solids_amount": 2}),
+        event("wet", "nappy", ts=at(DAY, 10)),
+    ])
+    day = DAY.isoformat()
+    assert rollup_rows(session) == {
+        (day, "feed"): (2, 0, 0, 0, 0, 120, 2),
+        (day, "nappy"): (1, 0, 0, 0, 0, 0, 0),
+        (day, "sleep"): (3, 5.5 * 3600, 2.5 * 3600, 3 * 3600, 3 * 3600, 0, 0),
+    }
+
+    # Moving an event to another day recomputes both days; deleting one drops it
+    next_day = date(2024, 5, 15)
+    crud.upsert_events(session, [
+        event("nap", "sleep", version=2, start_ts=at(next_day, 13), end_ts=at(next_day, 15)),
+        event("wet", "nappy", version=2, deleted=True, ts=at(DAY, 10)),
+    ])
+    rows = rollup_rows(session)
+    assert rows[(day, "sleep")] == (2, 4.5 * 3600, 1.5 * 3600, 3 * 3600, 3 * 3600, 0, 0)
+    assert rows[(next_day.isoformat(), "sleep")] == (1, 2 * 3600, 2 * 3600, 0, 2 * 3600, 0, 0)
+    assert (day, "nappy") not in rows
+
+    # A losing (stale) push changes nothing
+    crud.upsert_events(session, [event("night", "sleep", version=0, start_ts=at(DAY, 1), end_ts=at(DAY, 2))])
+    assert rollup_rows(session) == rows
+
+    # A rebuild that finds the rows already right leaves the clock alone
+    clock = crud.get_clock(session)
+    assert rollups.rebuild_rollups(session) == len(rows)
+    assert rollup_rows(session) == rows
+    assert crud.get_clock(session) == clock
+    # One that corrects them moves it, so cached /stats revalidate
+    session.execute(delete(DailyRollup))
+    session.commit()
+    assert rollups.rebuild_rollups(session) == len(rows)
+    assert rollup_rows(session) == rows
+    assert crud.get_clock(session) == clock + 1
+    session.execute(delete(DailyRollup))
+    session.commit()
+    assert rollups.rebuild_rollups(session, bump_clock=False) == len(rows)
+    assert crud.get_clock(session) == clock + 1
+    session.close()
+
+
+def test_local_days_follow_the_configured_zone(monkeypatch):
+    monkeypatch.setattr(rollups, "ROLLUP_TIMEZONE", "America/Boise")
+    # DST starts on 2024-03-10, so that local day is 23 hours long
+    start, end = rollups.day_bounds(date(2024, 3, 10))
+    assert end - start == 23 * 3600
+    # 03:30 UTC is 21:30 the previous evening in Boise (UTC-6 in May)
+    ev = event("late", "sleep", start_ts=at(DAY, 3, 30), end_ts=at(DAY, 6, 30))
+    assert rollups.rollup_key(ev) == (date(2024, 5, 13), "sleep")
+    assert rollups.is_night_sleep(ev.start_ts, ev.end_ts)
+
+
+def test_recompute_covers_runs_of_days_without_disturbing_others(tmp_path, monkeypatch):
+    monkeypatch.setattr(rollups, "ROLLUP_TIMEZONE", "UTC")
+    engine = create_engine(f"sqlite:///{tmp_path / 'rollups.db'}")
+    ensure_schema(engine)
+    session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)()
+    days = [date(2024, 1, 1) + timedelta(days=n) for n in (0, 1, 2, 5, 30, 31)]
+    crud.upsert_events(session, [event(f"feed-{d}", "feed", ts=at(d, 8)) for d in days])
+    crud.upsert_events(session, [event("nappy", "nappy", ts=at(days[2], 9))])
+    # Touches days 1 and 31 only; the feeds between them and the nappy are left as they were
+    crud.upsert_events(session, [
+        event(f"feed-{days[1]}", "feed", version=2, deleted=True, ts=at(days[1], 8)),
+        event("late", "feed", ts=at(days[5], 20)),
+    ])
+    rows = rollup_rows(session)
+    assert {key: value[0] for key, value in rows.items()} == {
+        (days[0].isoformat(), "feed"): 1,
+        (days[2].isoformat(), "feed"): 1,
+        (days[2].isoformat(), "nappy"): 1,
+        (days[3].isoformat(), "feed"): 1,
+        (days[4].isoformat(), "feed"): 1,
+        (days[5].isoformat(), "feed"): 2,
+    }
+    assert rollups._day_ranges(days) == [(days[0], days[3]), (days[4], days[5])]
+    session.close()
@@ -1,11 +1,30 @@
+import asyncio
+import gzip
+import json
+import threading
 import time
 import uuid
+from datetime import date, datetime
 import pytest
 from httpx import AsyncClient
+from app import auth
 from app.main import app
+from app.notify import ClockNotifier
 
 
 pytestmark = pytest.mark.asyncio
+ADMIN_HEADERS = {"Authorization": "Bearer test-admin-token"}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "test-admin-token")
+
+
+async def pair_device(ac):
+    device_id = f"dev-{uuid.uuid4()}"
+    r = await ac.post("/pair", json={"pairing_code": "abc", "device_id": device_id, "name": "Phone"})
+    return device_id, {"Authorization": f"Bearer {r.json()['token']}"}
 
 
 async def test_healthz():
@@ -69,3 +88,684 @@ async def test_pair_and_sync_flow(monkeypatch, tmp_path):
         assert latest["version"] == 2
 
 
+async def test_sync_push_batch_collapses_duplicates():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        ev_ids = [str(uuid.uuid4()) for _ in range(3)]
+        batch = [
+            {
+                "event_id": ev_id,
+                "type": "nappy",
+                "ts": now,
+                "created_ts": now,
+                "updated_ts": now,
+                "version": 1,
+                "device_id": device_id,
+            }
+            for ev_id in ev_ids
+        ]
+        newer = dict(batch[0], version=3, payload={"kind": "wet"})
+        batch.append(newer)
+
+        r = await ac.post("/sync/push", json=batch, headers=headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert [item["event"]["event_id"] for item in body["results"]] == ev_ids
+        assert body["results"][0]["event"]["version"] == 3
+
+        r2 = await ac.get(f"/sync/pull?since={body['server_clock'] - 3}", headers=headers)
+        pulled = {e["event_id"]: e for e in r2.json()["events"]}
+        assert set(ev_ids) <= set(pulled)
+        assert pulled[ev_ids[0]]["payload"] == {"kind": "wet"}
+
+
+async def test_sync_push_prefetch_spans_chunks(monkeypatch):
+    from app import crud
+
+    monkeypatch.setattr(crud, "PREFETCH_CHUNK_SIZE", 2)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        batch = [
+            {
+                "event_id": str(uuid.uuid4()),
+                "type": "feed",
+                "start_ts": now - 600,
+                "end_ts": now,
+                "created_ts": now,
+                "updated_ts": now,
+                "version": 1,
+                "device_id": device_id,
+            }
+            for _ in range(5)
+        ]
+        r = await ac.post("/sync/push", json=batch, headers=headers)
+        assert r.status_code == 200
+        first_clock = r.json()["server_clock"]
+
+        stale = [dict(ev, version=0) for ev in batch]
+        r2 = await ac.post("/sync/push", json=stale, headers=headers)
+        assert r2.json()["server_clock"] == first_clock
+        assert all(item["event"]["version"] == 1 for item in r2.json()["results"])
+
+
+async def test_sync_pull_paginates_by_server_clock():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        batch = [
+            {
+                "event_id": str(uuid.uuid4()),
+                "type": "nappy",
+                "ts": now,
+                "created_ts": now,
+                "updated_ts": now,
+                "version": 1,
+                "device_id": device_id,
+            }
+            for _ in range(5)
+        ]
+        r = await ac.post("/sync/push", json=batch, headers=headers)
+        since = r.json()["server_clock"] - 5
+
+        seen = []
+        has_more = True
+        while has_more:
+            page = (await ac.get(f"/sync/pull?since={since}&limit=2", headers=headers)).json()
+            assert len(page["events"]) <= 2
+            seen.extend(e["event_id"] for e in page["events"])
+            since, has_more = page["next_since"], page["has_more"]
+        assert seen == [ev["event_id"] for ev in batch]
+
+        r2 = await ac.get("/sync/pull?since=0&limit=0", headers=headers)
+        assert r2.status_code == 422
+
+
+async def test_pull_endpoints_stream_ndjson():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        ev_id = str(uuid.uuid4())
+        r = await ac.post("/sync/push", json=[{
+            "event_id": ev_id,
+            "type": "nappy",
+            "ts": now,
+            "created_ts": now,
+            "updated_ts": now,
+            "version": 1,
+            "device_id": device_id,
+        }], headers=headers)
+        clock = r.json()["server_clock"]
+
+        r2 = await ac.get(f"/sync/pull?since={clock - 1}&stream=true", headers=headers)
+        assert r2.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in r2.text.splitlines()]
+        assert lines[0] == {"server_clock": clock}
+        assert [e["event_id"] for e in lines[1:]] == [ev_id]
+        # A stream has no has_more, so it cannot be truncated with limit
+        assert (await ac.get("/sync/pull?since=0&stream=true&limit=1", headers=headers)).status_code == 422
+
+        growth_id = str(uuid.uuid4())
+        await ac.post("/growth", json={
+            "id": growth_id,
+            "device_id": device_id,
+            "category": "head",
+            "value": 41.5,
+            "unit": "cm",
+            "ts": now,
+            "created_ts": now,
+            "updated_ts": now,
+            "version": 1,
+        }, headers=headers)
+        r3 = await ac.get("/growth?category=head&stream=true", headers=headers)
+        rows = [json.loads(line) for line in r3.text.splitlines()[1:]]
+        assert growth_id in {row["id"] for row in rows}
+
+
+async def test_gzip_push_body_and_compressed_pull():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        batch = [
+            {
+                "event_id": str(uuid.uuid4()),
+                "type": "feed",
+                "payload": {"raw_text": "Breastfeed left 12m right 9m " * 4},
+                "start_ts": now - 900,
+                "end_ts": now,
+                "created_ts": now,
+                "updated_ts": now,
+                "version": 1,
+                "device_id": device_id,
+            }
+            for _ in range(20)
+        ]
+        r = await ac.post(
+            "/sync/push",
+            content=gzip.compress(json.dumps(batch).encode("utf-8")),
+            headers={**headers, "Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+        assert r.status_code == 200
+        assert len(r.json()["results"]) == 20
+
+        r2 = await ac.get(f"/sync/pull?since={r.json()['server_clock'] - 20}", headers={**headers, "Accept-Encoding": "gzip"})
+        assert r2.headers["content-encoding"] == "gzip"
+        assert len(r2.json()["events"]) == 20
+
+        r3 = await ac.post(
+            "/sync/push",
+            content=b"not gzip",
+            headers={**headers, "Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+        assert r3.status_code == 400
+
+
+async def test_sync_push_ack_only_returns_compact_results():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        base = {
+            "type": "sleep",
+            "start_ts": now - 1800,
+            "end_ts": now,
+            "created_ts": now,
+            "updated_ts": now,
+            "device_id": device_id,
+        }
+        kept = dict(base, event_id=str(uuid.uuid4()), version=5)
+        await ac.post("/sync/push", json=[kept], headers=headers)
+
+        fresh = dict(base, event_id=str(uuid.uuid4()), version=1)
+        stale = dict(kept, version=1)
+        r = await ac.post("/sync/push?ack_only=true", json=[fresh, stale], headers=headers)
+        assert r.status_code == 200
+        results = {item["event_id"]: item for item in r.json()["results"]}
+        assert results[fresh["event_id"]]["applied"] is True
+        assert results[fresh["event_id"]]["event"] is None
+        assert results[fresh["event_id"]]["server_clock"] == r.json()["server_clock"]
+        assert results[stale["event_id"]]["applied"] is False
+        assert results[stale["event_id"]]["event"]["version"] == 5
+
+        r2 = await ac.post("/sync/push?ack_only=true", json=[stale], headers=headers)
+        assert set(r2.json()["results"][0]) == {"event_id", "applied", "server_clock", "event"}
+
+
+async def test_growth_push_and_full_pull():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        growth_id = str(uuid.uuid4())
+        r = await ac.post("/growth", json={
+            "id": growth_id,
+            "device_id": device_id,
+            "category": "weight",
+            "value": 9.4,
+            "unit": "lb",
+            "ts": now,
+            "created_ts": now,
+            "updated_ts": now,
+            "version": 1,
+        }, headers=headers)
+        assert r.status_code == 200
+        assert r.json()["applied"] is True
+
+        r2 = await ac.get("/growth", headers=headers)
+        assert r2.status_code == 200
+        assert r2.json()["server_clock"] >= r.json()["server_clock"]
+        assert growth_id in {gd["id"] for gd in r2.json()["data"]}
+
+
+async def test_growth_batch_push_uses_one_clock_reservation():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        base = {"device_id": device_id, "category": "head", "value": 40.0, "unit": "cm",
+                "ts": now, "created_ts": now, "updated_ts": now, "version": 1}
+        ids = [str(uuid.uuid4()) for _ in range(3)]
+        items = [{**base, "id": gid} for gid in ids]
+        # A stale duplicate in the same batch collapses into the newer copy
+        items.append({**base, "id": ids[0], "version": 0, "value": 1.0})
+        r = await ac.post("/growth/batch", json=items, headers=headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert [res["id"] for res in body["results"]] == ids
+        assert all(res["applied"] and res["data"] is None for res in body["results"])
+        clocks = [res["server_clock"] for res in body["results"]]
+        assert clocks == list(range(body["server_clock"] - 2, body["server_clock"] + 1))
+
+        # Replaying an older version loses and gets the server's copy back
+        r2 = await ac.post("/growth/batch", json=[{**base, "id": ids[1], "version": 0}], headers=headers)
+        res = r2.json()["results"][0]
+        assert res["applied"] is False
+        assert res["data"]["version"] == 1
+        assert r2.json()["server_clock"] == body["server_clock"]
+
+
+async def test_token_cache_is_invalidated_on_repair_and_disable():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        assert (await ac.get("/sync/pull?since=0&limit=1")).status_code == 401
+        assert (await ac.get("/growth?since=1")).status_code == 401
+
+        device_id, old_headers = await pair_device(ac)
+        assert (await ac.get("/sync/pull?since=0&limit=1", headers=old_headers)).status_code == 200
+
+        r = await ac.post("/pair", json={"pairing_code": "abc", "device_id": device_id, "name": "Phone"})
+        new_headers = {"Authorization": f"Bearer {r.json()['token']}"}
+        assert (await ac.get("/sync/pull?since=0&limit=1", headers=old_headers)).status_code == 401
+        assert (await ac.get("/sync/pull?since=0&limit=1", headers=new_headers)).status_code == 200
+
+        assert (await ac.post(f"/admin/devices/{device_id}/disable", headers=ADMIN_HEADERS)).status_code == 200
+        assert (await ac.get("/sync/pull?since=0&limit=1", headers=new_headers)).status_code == 401
+        assert (await ac.post("/admin/devices/no-such-device/disable", headers=ADMIN_HEADERS)).status_code == 404
+
+        # Pairing again does not re-enable it
+        r = await ac.post("/pair", json={"pairing_code": "abc", "device_id": device_id, "name": "Phone"})
+        assert r.status_code == 403
+
+
+async def test_admin_endpoints_require_the_admin_token(monkeypatch):
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        device_id, headers = await pair_device(ac)
+        assert (await ac.post(f"/admin/devices/{device_id}/disable")).status_code == 401
+        assert (await ac.post("/admin/compact", headers=headers)).status_code == 401
+        assert (await ac.get("/admin/watermarks", headers=ADMIN_HEADERS)).status_code == 200
+
+        monkeypatch.setattr(auth, "ADMIN_TOKEN", None)
+        assert (await ac.get("/admin/watermarks", headers=ADMIN_HEADERS)).status_code == 403
+
+
+async def test_sync_wait_wakes_on_push_and_times_out():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        clock = (await ac.get("/sync/pull?since=0&limit=1", headers=headers)).json()["server_clock"]
+
+        r = await ac.get(f"/sync/wait?since={clock}&timeout=0.3", headers=headers)
+        assert r.json() == {"server_clock": clock, "changed": False}
+
+        waiter = asyncio.create_task(ac.get(f"/sync/wait?since={clock}&timeout=10", headers=headers))
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        started = time.monotonic()
+        await ac.post("/sync/push", json=[{
+            "event_id": str(uuid.uuid4()),
+            "type": "nappy",
+            "ts": now,
+            "created_ts": now,
+            "updated_ts": now,
+            "version": 1,
+            "device_id": device_id,
+        }], headers=headers)
+        r2 = await waiter
+        assert time.monotonic() - started < 1.0
+        assert r2.json() == {"server_clock": clock + 1, "changed": True}
+
+
+async def test_timed_out_wait_answers_the_stored_clock_not_the_cached_one(monkeypatch):
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        device_id, headers = await pair_device(ac)
+        now = int(time.time())
+        r = await ac.post("/sync/push", json=[{"event_id": str(uuid.uuid4()), "type": "nappy", "ts": now,
+                                               "created_ts": now, "updated_ts": now, "version": 1,
+                                               "device_id": device_id}], headers=headers)
+        clock = r.json()["server_clock"]
+    assert clock > 0
+
+    # A worker that has not polled yet only knows clock 0
+    fresh = ClockNotifier()
+
+    async def no_poll():
+        pass
+
+    monkeypatch.setattr(fresh, "_poll", no_poll)
+    assert await fresh.wait_for(clock, 0.05) == clock
+
+
+async def test_pull_endpoints_answer_304_until_the_clock_moves():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        r = await ac.get("/sync/pull?since=0&limit=5", headers=headers)
+        etag = r.headers["etag"]
+        assert r.headers["cache-control"] == "private, no-cache"
+
+        r2 = await ac.get("/sync/pull?since=0&limit=5", headers={**headers, "If-None-Match": etag})
+        assert r2.status_code == 304
+        assert r2.headers["etag"] == etag
+        # Different query parameters never share a tag
+        r3 = await ac.get("/sync/pull?since=0&limit=6", headers={**headers, "If-None-Match": etag})
+        assert r3.status_code == 200
+
+        g = await ac.get("/growth?category=weight", headers=headers)
+        g2 = await ac.get("/growth?category=weight", headers={**headers, "If-None-Match": g.headers["etag"]})
+        assert g2.status_code == 304
+
+        await ac.post("/sync/push", json=[{
+            "event_id": str(uuid.uuid4()),
+            "type": "nappy",
+            "ts": now,
+            "created_ts": now,
+            "updated_ts": now,
+            "version": 1,
+            "device_id": device_id,
+        }], headers=headers)
+        r4 = await ac.get("/sync/pull?since=0&limit=5", headers={**headers, "If-None-Match": etag})
+        assert r4.status_code == 200
+        assert r4.headers["etag"] != etag
+
+        u = await ac.get("/app/update")
+        u2 = await ac.get("/app/update", headers={"If-None-Match": u.headers["etag"]})
+        assert u2.status_code == 304
+
+
+async def test_pulls_and_pushes_record_device_watermarks():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        r = await ac.get("/admin/watermarks", headers=ADMIN_HEADERS)
+        mine = next(d for d in r.json()["devices"] if d["device_id"] == device_id)
+        assert mine == {"device_id": device_id, "name": "Phone", "last_clock": 0, "updated_ts": None}
+
+        p = await ac.post("/sync/push", json=[{
+            "event_id": str(uuid.uuid4()),
+            "type": "nappy",
+            "ts": now,
+            "created_ts": now,
+            "updated_ts": now,
+            "version": 1,
+            "device_id": device_id,
+        }], headers=headers)
+        clock = p.json()["server_clock"]
+        await ac.get(f"/sync/pull?since={clock}", headers=headers)
+        # An older since never lowers the watermark; a bogus one is capped at the server clock
+        await ac.get("/sync/pull?since=0", headers=headers)
+        await ac.get(f"/sync/pull?since={clock + 1000}", headers=headers)
+
+        body = (await ac.get("/admin/watermarks", headers=ADMIN_HEADERS)).json()
+        mine = next(d for d in body["devices"] if d["device_id"] == device_id)
+        assert mine["last_clock"] == clock
+        assert mine["updated_ts"] >= now
+        assert body["min_clock"] <= clock <= body["max_clock"] <= body["server_clock"]
+
+        await ac.post(f"/admin/devices/{device_id}/disable", headers=ADMIN_HEADERS)
+        body = (await ac.get("/admin/watermarks", headers=ADMIN_HEADERS)).json()
+        assert device_id not in [d["device_id"] for d in body["devices"]]
+
+
+async def test_compaction_removes_tombstones_and_resets_lagging_devices():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        old = int(time.time()) - 100 * 86400
+        device_a, headers_a = await pair_device(ac)
+        device_b, headers_b = await pair_device(ac)
+        await ac.get("/sync/pull?since=1", headers=headers_b)
+
+        ev = {
+            "event_id": str(uuid.uuid4()),
+            "type": "nappy",
+            "ts": old,
+            "created_ts": old,
+            "updated_ts": old,
+            "version": 1,
+            "device_id": device_a,
+        }
+        await ac.post("/sync/push", json=[ev], headers=headers_a)
+        p = await ac.post("/sync/push", json=[{**ev, "version": 2, "deleted": True}], headers=headers_a)
+        tombstone_clock = p.json()["server_clock"]
+        await ac.get(f"/sync/pull?since={tombstone_clock}", headers=headers_a)
+
+        # A device that has only made a full pull holds live rows too, so it pins the watermark
+        device_c, headers_c = await pair_device(ac)
+        await ac.get("/sync/pull?since=0", headers=headers_c)
+        assert (await ac.post("/admin/compact", headers=ADMIN_HEADERS)).json()["watermark"] == 0
+        # So does one with no watermark row at all, e.g. it has not pulled since the upgrade
+        device_d, headers_d = await pair_device(ac)
+
+        dry = (await ac.post("/admin/compact?retention_days=30", headers=ADMIN_HEADERS)).json()
+        assert dry["dry_run"] is True
+        assert dry["events_removed"] >= 1
+        assert device_b in dry["devices_reset"] and device_a not in dry["devices_reset"]
+        assert ev["event_id"] in [e["event_id"] for e in (await ac.get("/sync/pull?since=0", headers=headers_a)).json()["events"]]
+
+        report = (await ac.post("/admin/compact?dry_run=false&retention_days=30", headers=ADMIN_HEADERS)).json()
+        assert report["server_clock"] > tombstone_clock
+        assert device_b in report["devices_reset"] and device_d in report["devices_reset"]
+        assert (await ac.get("/sync/pull?since=1", headers=headers_d)).json()["reset"] is True
+        assert (await ac.post("/sync/push", json=[ev], headers=headers_d)).status_code == 409
+
+        r = (await ac.get("/sync/pull?since=1", headers=headers_b)).json()
+        assert r["reset"] is True and r["events"] == [] and r["next_since"] == 0
+        assert (await ac.get("/growth?since=1", headers=headers_b)).json()["reset"] is True
+        # Its stale live copy of the compacted row must not come back through a push
+        revived = await ac.post("/sync/push", json=[ev], headers=headers_b)
+        assert revived.status_code == 409
+        # A full pull acknowledges the reset; the tombstone is gone for good
+        full = (await ac.get("/sync/pull?since=0", headers=headers_b)).json()
+        assert full["reset"] is False
+        assert ev["event_id"] not in [e["event_id"] for e in full["events"]]
+        new_ev = {**ev, "event_id": str(uuid.uuid4()), "device_id": device_b}
+        assert (await ac.post("/sync/push", json=[new_ev], headers=headers_b)).status_code == 200
+        assert (await ac.get("/sync/pull?since=1", headers=headers_b)).json()["reset"] is False
+        assert (await ac.get(f"/sync/pull?since={tombstone_clock}", headers=headers_a)).json()["reset"] is False
+
+
+async def test_db_diagnostics_report():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        r = await ac.get("/admin/db/diagnostics", headers=ADMIN_HEADERS)
+        assert r.status_code == 200
+        body = r.json()
+        assert "growth_data" in body["tables"]
+        assert body["counts"]["events"]["total"] >= body["counts"]["events"]["deleted"]
+        assert "checkpoint" not in body
+
+        r2 = await ac.get("/admin/db/diagnostics?checkpoint=true", headers=ADMIN_HEADERS)
+        assert r2.json()["journal_mode"] != "wal" or "checkpoint" in r2.json()
+
+
+async def test_stats_aggregate_rollups_by_day_week_and_month():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        device_id, headers = await pair_device(ac)
+        url = "/stats?from=2001-01-01&to=2001-01-31&granularity="
+        empty = {g: (await ac.get(url + g, headers=headers)).json() for g in ("day", "week", "month")}
+        assert len(empty["day"]["buckets"]) == 31
+        assert [b["start"] for b in empty["week"]["buckets"]] == [
+            "2001-01-01", "2001-01-08", "2001-01-15", "2001-01-22", "2001-01-29"]
+        assert [b["start"] for b in empty["month"]["buckets"]] == ["2001-01-01"]
+        assert empty["month"]["total"]["sleep"]["count"] == 0
+
+        def local(day, hour):
+            return int(datetime(2001, 1, day, hour).timestamp())
+
+        def ev(type, **times):
+            t = times.get("start_ts") or times.get("ts")
+            return {"event_id": str(uuid.uuid4()), "type": type, "created_ts": t, "updated_ts": t,
+                    "version": 1, "device_id": device_id, **times}
+
+        await ac.post("/sync/push", json=[
+            ev("sleep", start_ts=local(2, 20), end_ts=local(2, 23)),
+            ev("sleep", start_ts=local(9, 13), end_ts=local(9, 14)),
+            ev("feed", ts=local(9, 8), payload={"bottle_amount_ml": 90}),
+            ev("nappy", ts=local(30, 8)),
+        ], headers=headers)
+
+        r = await ac.get(url + "week", headers=headers)
+        week = r.json()
+        first, second = week["buckets"][0], week["buckets"][1]
+        assert first["sleep"]["night_seconds"] == 3 * 3600
+        assert second["sleep"]["nap_seconds"] == 3600
+        assert second["feed"]["bottle_ml_total"] == 90
+        assert week["buckets"][4]["nappy"]["count"] == 1
+
+        month = (await ac.get(url + "month", headers=headers)).json()
+        assert month["buckets"][0] == {**month["total"], "start": "2001-01-01"}
+        assert month["total"]["sleep"]["total_seconds"] == 4 * 3600
+        assert month["total"]["sleep"]["longest_stretch_seconds"] == 3 * 3600
+
+        cached = await ac.get(url + "week", headers={**headers, "If-None-Match": r.headers["etag"]})
+        assert cached.status_code == 304
+        bad = await ac.get("/stats?from=2001-02-01&to=2001-01-01", headers=headers)
+        assert bad.status_code == 400
+        too_long = await ac.get("/stats?from=1000-01-01&to=2100-12-30&granularity=day", headers=headers)
+        assert too_long.status_code == 400
+        # The last month of the calendar ends its iteration instead of overflowing
+        last = await ac.get("/stats?from=9999-01-01&to=9999-12-31&granularity=month", headers=headers)
+        assert last.status_code == 200
+        assert last.json()["buckets"][-1]["start"] == "9999-12-01"
+
+
+async def test_analytics_report_for_a_range_of_days():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        device_id, headers = await pair_device(ac)
+
+        first, second = date(2100, 3, 1), date(2100, 3, 2)
+
+        def local(day, hour):
+            return int(datetime(day.year, day.month, day.day, hour).timestamp())
+
+        def ev(type, **times):
+            t = times.get("start_ts") or times.get("ts")
+            return {"event_id": str(uuid.uuid4()), "type": type, "created_ts": t, "updated_ts": t,
+                    "version": 1, "device_id": device_id, **times}
+
+        await ac.post("/sync/push", json=[
+            ev("sleep", start_ts=local(first, 19), end_ts=local(first, 23)),
+            ev("sleep", start_ts=local(second, 1), end_ts=local(second, 6)),
+            ev("sleep", start_ts=local(second, 13), end_ts=local(second, 14)),
+            ev("feed", ts=local(second, 8)),
+            ev("feed", ts=local(second, 11)),
+        ], headers=headers)
+
+        r = await ac.get(f"/analytics?from={first}&to={second}&window=2", headers=headers)
+        assert r.status_code == 200
+        report = r.json()
+        assert report["events"] == 5
+        assert report["sleep"]["durations"]["count"] == 3
+        # Both overnight sleeps belong to the first night
+        assert report["sleep"]["longest_per_night"]["count"] == 2
+        assert report["sleep"]["longest_per_night"]["max"] == 5 * 3600
+        assert report["wake_windows"]["median"] == 4.5 * 3600
+        assert report["feed_intervals"]["count"] == 1 and report["feed_intervals"]["max"] == 3 * 3600
+        assert report["daily_sleep"]["rolling_mean"] == [{"day": second.isoformat(), "seconds": 5 * 3600}]
+
+        cached = await ac.get(f"/analytics?from={first}&to={second}&window=2",
+                              headers={**headers, "If-None-Match": r.headers["etag"]})
+        assert cached.status_code == 304
+        bad = await ac.get(f"/analytics?from={second}&to={first}", headers=headers)
+        assert bad.status_code == 400
+        for edge in ("to=9999-12-31", "from=0001-01-01"):
+            assert (await ac.get(f"/analytics?{edge}", headers=headers)).status_code == 422
+        widest = await ac.get("/analytics?from=1970-01-01&to=9999-12-30", headers=headers)
+        assert widest.status_code == 200
+        assert widest.json()["events"] >= 5
+
+
+async def test_analytics_report_is_built_off_the_event_loop(monkeypatch):
+    from app import analytics
+    threads = []
+    build = analytics.event_report
+
+    def recording_report(*args):
+        threads.append(threading.current_thread())
+        return build(*args)
+
+    monkeypatch.setattr(analytics, "event_report", recording_report)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        _, headers = await pair_device(ac)
+        assert (await ac.get("/analytics?from=2001-01-01&to=2001-01-02", headers=headers)).status_code == 200
+    assert threads and threads[0] is not threading.main_thread()
+
+
+async def test_growth_percentiles_are_cached_until_growth_rows_change(monkeypatch):
+    from app import growth_percentiles
+    threads = []
+    compute = growth_percentiles.compute_percentiles
+
+    def recording_compute(*args):
+        threads.append(threading.current_thread())
+        return compute(*args)
+
+    monkeypatch.setattr(growth_percentiles, "compute_percentiles", recording_compute)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        now = int(time.time())
+        device_id, headers = await pair_device(ac)
+        base = {"device_id": device_id, "category": "height", "unit": "in",
+                "created_ts": now, "updated_ts": now, "version": 1}
+        first_id = str(uuid.uuid4())
+        await ac.post("/growth", json={**base, "id": first_id, "value": 21.0, "ts": now}, headers=headers)
+
+        r = await ac.get("/growth/percentiles?category=height", headers=headers)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["reference_percentiles"] == [5.0, 25.0, 50.0, 75.0, 95.0]
+        assert body["points"][0]["age_months"] == 0
+        point = next(p for p in body["points"] if p["id"] == first_id)
+        assert 0 < point["percentile"] < 100
+        assert len(point["reference_values"]) == 5
+        assert point["reference_values"] == sorted(point["reference_values"])
+
+        cached = await ac.get("/growth/percentiles?category=height", headers={**headers, "If-None-Match": r.headers["etag"]})
+        assert cached.status_code == 304
+
+        await ac.post("/growth", json={**base, "id": str(uuid.uuid4()), "value": 8.0, "unit": "furlong",
+                                       "ts": now + 1}, headers=headers)
+        r2 = await ac.get("/growth/percentiles?category=height", headers={**headers, "If-None-Match": r.headers["etag"]})
+        assert r2.status_code == 200
+        assert r2.json()["server_clock"] > body["server_clock"]
+        unknown = next(p for p in r2.json()["points"] if p["unit"] == "furlong")
+        assert unknown["percentile"] is None and unknown["reference_values"] is None
+
+        assert (await ac.get("/growth/percentiles?category=head", headers=headers)).status_code == 422
+    # Cache misses are computed in the threadpool, not on the event loop
+    assert threads and all(t is not threading.main_thread() for t in threads)
+
+
+async def test_events_window_returns_overlapping_events_a_page_at_a_time():
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        device_id, headers = await pair_device(ac)
+        t0 = 5_000_000_000
+        hour = 3600
+
+        def ev(type, **times):
+            return {"event_id": str(uuid.uuid4()), "type": type, "created_ts": t0, "updated_ts": t0,
+                    "version": 1, "device_id": device_id, **times}
+
+        inside = [
+            ev("sleep", start_ts=t0 - 2 * hour, end_ts=t0 + hour),  # started before the window
+            ev("feed", ts=t0 + 2 * hour),
+            ev("feed", start_ts=t0 + 3 * hour, end_ts=t0 + 3 * hour + 900),
+            ev("sleep", start_ts=t0 + 4 * hour),  # still running
+            ev("nappy", ts=t0 + 5 * hour),
+        ]
+        outside = [
+            ev("sleep", start_ts=t0 - 3 * hour, end_ts=t0),  # ends as the window opens
+            ev("nappy", ts=t0 + 6 * hour),
+            {**ev("feed", ts=t0 + hour), "deleted": True},
+        ]
+        await ac.post("/sync/push", json=inside + outside, headers=headers)
+
+        url = f"/events?from={t0}&to={t0 + 6 * hour}"
+        r = await ac.get(url, headers=headers)
+        assert r.status_code == 200
+        assert [e["event_id"] for e in r.json()["events"]] == [e["event_id"] for e in inside]
+        assert r.json()["has_more"] is False and r.json()["next_cursor"] is None
+
+        r = await ac.get(url + "&type=sleep&type=nappy", headers=headers)
+        assert [e["type"] for e in r.json()["events"]] == ["sleep", "sleep", "nappy"]
+
+        seen, cursor = [], None
+        while True:
+            page = (await ac.get(url + "&limit=2" + (f"&cursor={cursor}" if cursor else ""), headers=headers)).json()
+            seen += [e["event_id"] for e in page["events"]]
+            if not page["has_more"]:
+                break
+            cursor = page["next_cursor"]
+        assert seen == [e["event_id"] for e in inside]
+
+        first = await ac.get(url, headers=headers)
+        cached = await ac.get(url, headers={**headers, "If-None-Match": first.headers["etag"]})
+        assert cached.status_code == 304
+        assert (await ac.get(url + "&cursor=nonsense", headers=headers)).status_code == 400
+        assert (await ac.get(f"/events?from={t0}&to={t0}", headers=headers)).status_code == 400
+        assert (await ac.get(f"/events?from={t0}&to={t0 + 8 * 86400}", headers=headers)).status_code == 400
+        assert (await ac.get(f"/events?from={t0}&to={2 ** 63}", headers=headers)).status_code == 422
+        assert (await ac.get(url + f"&cursor={2 ** 63}:x", headers=headers)).status_code == 400
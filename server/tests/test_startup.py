@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+# Import, startup events and a first /healthz, in a fresh interpreter
+STARTUP_BUDGET_SECONDS = 3.0
+
+COLD_START = """
+import json, sys, time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+from app.main import app
+with TestClient(app) as client:
+    ok = client.get("/healthz").status_code == 200
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "ok": ok,
+    "deferred_loaded": [m for m in ("alembic", "app.migrations", "app.seed", "numpy") if m in sys.modules],
+}))
+"""
+
+
+def cold_start(**env) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", COLD_START],
+        cwd=SERVER_DIR,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_bootstrapped_worker_starts_within_budget():
+    report = cold_start(TCB_BOOTSTRAPPED="1")
+    assert report["ok"]
+    assert report["deferred_loaded"] == []
+    assert report["seconds"] < STARTUP_BUDGET_SECONDS
+
+
+def test_worker_checking_migrations_starts_within_budget():
+    report = cold_start(TCB_BOOTSTRAPPED="0")
+    assert report["ok"]
+    assert "app.seed" not in report["deferred_loaded"]
+    assert report["seconds"] < STARTUP_BUDGET_SECONDS